@@ -1,244 +1,162 @@
-from dotenv import load_dotenv
 import os
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from datetime import datetime, timedelta,timezone
-from functools import wraps
-from flask_cors import CORS
+import time
+import click
+from datetime import timedelta
+from flask import Flask, jsonify
 from models import db
-from models import Candidate,EndUser,VotingSession,Voter,Vote
-from zoneinfo import ZoneInfo
+from auth import jwt
+import cache
+import fraud
+import http_cache
+import jobs
+import outbox
+import receipts
+import replica
+import warmup
+
+
+def create_app(config=None, with_migrations=True):
+    """Application factory.
+
+    Web workers should pass ``with_migrations=False`` (see serve.py): Alembic is
+    only needed by the ``flask db`` commands and is the slowest import we have.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    app = Flask(__name__)
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'super-secret-jwt-key')
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(hours=int(os.getenv('JWT_REFRESH_HOURS', '12')))
+    app.config['JWT_DECODE_CACHE_SIZE'] = int(os.getenv('JWT_DECODE_CACHE_SIZE', '4096'))
+    app.config['JWT_REVOCATION_REFRESH'] = float(os.getenv('JWT_REVOCATION_REFRESH', '5'))
+    app.config['DATABASE_REPLICA_URL'] = os.getenv('DATABASE_REPLICA_URL')
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+    app.config['ARCHIVE_DIR'] = os.getenv('ARCHIVE_DIR', os.path.join(app.instance_path, 'archive'))
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.getenv('ARCHIVE_BATCH_SIZE', '5000'))
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.getenv('ARCHIVE_AFTER_DAYS', '7'))
+    app.config['CACHE_TTL'] = int(os.getenv('CACHE_TTL', '30'))
+    app.config['CACHE_MAXSIZE'] = int(os.getenv('CACHE_MAXSIZE', '1024'))
+    app.config['CACHE_URL'] = os.getenv('CACHE_URL')
+    app.config['WARMUP_ENABLED'] = os.getenv('WARMUP_ENABLED', '1') == '1'
+    app.config['WARMUP_LEAD_SECONDS'] = int(os.getenv('WARMUP_LEAD_SECONDS', '600'))
+    app.config['WARMUP_POLL_SECONDS'] = int(os.getenv('WARMUP_POLL_SECONDS', '30'))
+    app.config['RECEIPTS_ENABLED'] = os.getenv('RECEIPTS_ENABLED', '1') == '1'
+    app.config['RECEIPTS_BATCH_SIZE'] = int(os.getenv('RECEIPTS_BATCH_SIZE', '500'))
+    app.config['RECEIPTS_BATCH_INTERVAL'] = float(os.getenv('RECEIPTS_BATCH_INTERVAL', '1'))
+    app.config['RECEIPTS_LOOKBACK_IDS'] = int(os.getenv('RECEIPTS_LOOKBACK_IDS', '10000'))
+    app.config['RECEIPTS_FULL_SCAN_SECONDS'] = float(os.getenv('RECEIPTS_FULL_SCAN_SECONDS', '3600'))
+    app.config['JOBS_IN_WEB'] = os.getenv('JOBS_IN_WEB', '0') == '1'
+    app.config['JOBS_WORKERS'] = int(os.getenv('JOBS_WORKERS', '2'))
+    app.config['JOBS_POLL_SECONDS'] = float(os.getenv('JOBS_POLL_SECONDS', '2'))
+    app.config['JOBS_PROGRESS_INTERVAL'] = float(os.getenv('JOBS_PROGRESS_INTERVAL', '0.5'))
+    app.config['JOBS_HEARTBEAT_SECONDS'] = float(os.getenv('JOBS_HEARTBEAT_SECONDS', '10'))
+    app.config['JOBS_STALE_SECONDS'] = float(os.getenv('JOBS_STALE_SECONDS', '60'))
+    app.config['EXPORT_DIR'] = os.getenv('EXPORT_DIR', os.path.join(app.instance_path, 'exports'))
+    app.config['IMPORT_DIR'] = os.getenv('IMPORT_DIR', os.path.join(app.instance_path, 'imports'))
+    app.config['PURGE_CHUNK_SIZE'] = int(os.getenv('PURGE_CHUNK_SIZE', '1000'))
+    app.config['SNAPSHOT_DIR'] = os.getenv('SNAPSHOT_DIR', os.path.join(app.instance_path, 'snapshots'))
+    app.config['SNAPSHOT_GRACE_SECONDS'] = int(os.getenv('SNAPSHOT_GRACE_SECONDS', '60'))
+    app.config['FRAUD_ENABLED'] = os.getenv('FRAUD_ENABLED', '1') == '1'
+    app.config['FRAUD_QUEUE_SIZE'] = int(os.getenv('FRAUD_QUEUE_SIZE', '10000'))
+    app.config['FRAUD_IP_WINDOW_SECONDS'] = float(os.getenv('FRAUD_IP_WINDOW_SECONDS', '600'))
+    app.config['FRAUD_IP_THRESHOLD'] = int(os.getenv('FRAUD_IP_THRESHOLD', '50'))
+    app.config['FRAUD_BURST_WINDOW_SECONDS'] = float(os.getenv('FRAUD_BURST_WINDOW_SECONDS', '60'))
+    app.config['FRAUD_BURST_THRESHOLD'] = int(os.getenv('FRAUD_BURST_THRESHOLD', '200'))
+    app.config['FRAUD_RAPID_WINDOW_SECONDS'] = float(os.getenv('FRAUD_RAPID_WINDOW_SECONDS', '10'))
+    app.config['FRAUD_RAPID_THRESHOLD'] = int(os.getenv('FRAUD_RAPID_THRESHOLD', '5'))
+    app.config['OUTBOX_ENABLED'] = os.getenv('OUTBOX_ENABLED', '1') == '1'
+    app.config['OUTBOX_POLL_SECONDS'] = float(os.getenv('OUTBOX_POLL_SECONDS', '1'))
+    app.config['OUTBOX_BATCH_SIZE'] = int(os.getenv('OUTBOX_BATCH_SIZE', '500'))
+    app.config['OUTBOX_SETTLE_SECONDS'] = float(os.getenv('OUTBOX_SETTLE_SECONDS', '2'))
+    app.config['OUTBOX_RETENTION_HOURS'] = float(os.getenv('OUTBOX_RETENTION_HOURS', '24'))
+    # Reverse proxies in front of the app whose X-Forwarded-For we trust.
+    app.config['PROXY_HOPS'] = int(os.getenv('PROXY_HOPS', '0'))
+    app.config['COMPRESS_ENABLED'] = os.getenv('COMPRESS_ENABLED', '1') == '1'
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+    app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', '6'))
+    if config:
+        app.config.update(config)
+    replica.configure(app)
+    if app.config['PROXY_HOPS']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        hops = app.config['PROXY_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
+    from flask_cors import CORS
+    CORS(app, origins=["http://localhost:5173"], supports_credentials=True,
+         expose_headers=["X-Total-Count", "ETag"])
+
+    db.init_app(app)
+    jwt.init_app(app)
+    cache.init_app(app)
+    http_cache.init_app(app)
+    jobs.init_app(app)
+    warmup.init_app(app)
+    receipts.init_app(app)
+    fraud.init_app(app)
+    outbox.init_app(app)
+    if with_migrations:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    from routes.auth import auth_bp
+    from routes.admin import admin_bp
+    from routes.voters import voter_bp
+    from routes.receipts import receipts_bp
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(voter_bp)
+    app.register_blueprint(receipts_bp)
+
+    register_commands(app)
+    register_error_handlers(app)
+    return app
+
+
+def register_commands(app):
+    @app.cli.command('archive-elections')
+    def archive_elections():
+        """Move ballots of elections closed for ARCHIVE_AFTER_DAYS to cold storage."""
+        from archive import archive_election, closed_elections
+        for election in closed_elections(timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])):
+            manifest = archive_election(election.id)
+            print(f"Archived election {election.id}: {manifest['vote_count']} votes -> {manifest['file']}")
+
+
+    @app.cli.command('finalize-elections')
+    def finalize_elections():
+        """Write results snapshots for elections whose voting has ended."""
+        from models import VotingSession
+        import snapshots
+        election_ids = db.session.execute(db.select(VotingSession.election_id).distinct()).scalars()
+        for election_id in election_ids.all():
+            if warmup.results_final(election_id):
+                snapshots.ensure(election_id)
+                print(f"Election {election_id}: {snapshots.snapshot_path(election_id, 'results')}")
+
+    @app.cli.command('run-jobs')
+    @click.option('--workers', type=int, default=None, help='Runner threads (default JOBS_WORKERS).')
+    def run_jobs(workers):
+        """Run queued background jobs until interrupted."""
+        jobs.start(app, workers)
+        print(f"Job runner started with {workers or app.config['JOBS_WORKERS']} workers")
+        while True:
+            time.sleep(3600)
+
+
+def register_error_handlers(app):
+    @app.errorhandler(404)
+    def not_found(error):
+        return jsonify({"message": "Not found"}), 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        db.session.rollback()
+        return jsonify({"message": "Internal server error"}), 500
 
 
-
-
-
-
-
-
-load_dotenv()
-JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'super-secret-jwt-key')
-
-app = Flask(__name__)
-
-CORS(app, origins=["http://localhost:5173"], supports_credentials=True)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = JWT_SECRET_KEY
-
-db.init_app(app)
-migrate = Migrate(app, db)
-jwt = JWTManager(app)
-
-
-# Role check decorator
-def role_required(required_role):
-    def decorator(fn):
-        @wraps(fn)
-        def wrapper(*args, **kwargs):
-            user_id = int(get_jwt_identity())
-            user = EndUser.query.get(user_id)
-            if user and user.role == required_role:
-                return fn(*args, **kwargs)
-            return jsonify({"message": "Forbidden: Insufficient privileges"}), 403
-        return wrapper
-    return decorator
-
-# Register blueprint after db is initialized
-from routes.admin import admin_bp
-app.register_blueprint(admin_bp)
-
-from routes.voters import voter_bp
-app.register_blueprint(voter_bp)
-
-@app.route('/register', methods=['POST'])
-def register():
-    data = request.get_json()
-    if not data or not all(k in data for k in ("name", "email", "password","school_id")):
-        return jsonify({"message": "Missing data"}), 400
-
-    if EndUser.query.filter_by(email=data['email']).first():
-        return jsonify({"message": "Email already registered"}), 409
-    
-    if EndUser.query.filter_by(school_id=data['school_id']).first():
-        return jsonify({"message": "School ID already registered"}), 409
-    
-    if not data['email'].endswith("@usiu.ac.ke"):
-        return jsonify({"message": "Use your institutional email"}), 400
-
-
-    hashed_password = generate_password_hash(data['password'])
-    user = EndUser(
-        name=data['name'],
-        email=data['email'],
-        school_id=data['school_id'],
-        password_hash=hashed_password,
-        role='voter'
-    )
-    db.session.add(user)
-    db.session.commit()
-    return jsonify({"message": "User registered successfully"}), 201
-
-@app.route('/login', methods=['POST'])
-def login():
-    data = request.get_json()
-    if not data or not all(k in data for k in ("email", "password")):
-        return jsonify({"message": "Missing data"}), 400
-
-    user = EndUser.query.filter_by(email=data['email']).first()
-    if user and check_password_hash(user.password_hash, data['password']):
-        access_token = create_access_token(identity=str(user.student_id), expires_delta=timedelta(hours=1))
-        return jsonify({"access_token": access_token, "student_id": user.student_id, "role": user.role}), 200
-    return jsonify({"message": "Invalid credentials"}), 401
-
-@app.route('/candidates', methods=['GET'])
-@jwt_required()
-def list_candidates():
-    election_id = request.args.get('election_id')
-    position_id = request.args.get('position_id')
-    query = Candidate.query
-    if election_id:
-        query = query.filter_by(election_id=election_id)
-    if position_id:
-        query = query.filter_by(position_id=position_id)
-    candidates = query.all()
-    output = [c.to_dict() for c in candidates]
-    return jsonify(output), 200
-
-
-
-
-from datetime import datetime
-from zoneinfo import ZoneInfo  # Requires Python 3.9+
-from flask import request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import VotingSession, Vote, Candidate, db
-
-@app.route('/vote', methods=['POST'])
-@jwt_required()
-def cast_vote():
-    data = request.get_json()
-    required = ("election_id", "position_id", "candidate_id")
-    if not data or not all(k in data for k in required):
-        return jsonify({"message": "Missing data"}), 400
-
-    student_id = get_jwt_identity()
-    
-    
-    nairobi = ZoneInfo("Africa/Nairobi")
-    now = datetime.now(nairobi)
-
-    session = VotingSession.query.filter_by(
-        election_id=data['election_id']
-    ).first()
-
-    if not session:
-        return jsonify({"message": "No session found for this election"}), 403
-
-    # Convert session times to Nairobi timezone
-    if session.start_time.tzinfo is None:
-        session.start_time = session.start_time.replace(tzinfo=ZoneInfo("Africa/Nairobi"))
-    if session.end_time.tzinfo is None:
-        session.end_time = session.end_time.replace(tzinfo=ZoneInfo("Africa/Nairobi"))
-
-    print("Now:", now)
-    print("Session start:", session.start_time)
-    print("Session end:", session.end_time)
-    print("Session status before update:", session.status)
-
-    if session.status == 'scheduled' and session.start_time <= now <= session.end_time:
-        session.status = 'open'
-        db.session.commit()
-
-    if session.status != 'open' or not (session.start_time <= now <= session.end_time):
-        return jsonify({"message": "Voting is not open for this election"}), 403
-
-    existing_vote = Vote.query.filter_by(
-        student_id=student_id,
-        election_id=data['election_id'],
-        position_id=data['position_id']
-    ).first()
-    if existing_vote:
-        return jsonify({"message": "You have already voted for this position"}), 400
-
-    vote = Vote(
-        student_id=student_id,
-        election_id=data['election_id'],
-        position_id=data['position_id'],
-        candidate_id=data['candidate_id']
-    )
-    db.session.add(vote)
-
-    candidate = Candidate.query.get(data['candidate_id'])
-    if candidate:
-        candidate.votes += 1
-
-    db.session.commit()
-    return jsonify({"message": "Vote cast successfully"}), 201
-
-
-@app.route('/results', methods=['GET'])
-@jwt_required()
-def results():
-    election_id = request.args.get('election_id')
-    position_id = request.args.get('position_id')
-    query = Candidate.query
-    if election_id:
-        query = query.filter_by(election_id=election_id)
-    if position_id:
-        query = query.filter_by(position_id=position_id)
-    candidates = query.order_by(Candidate.vote_count.desc()).all()
-    results = [{
-        "candidate_id": c.id,
-        "name": c.name,
-        "election_id": c.election_id,
-        "position_id": c.position_id,
-        "votes": c.vote_count
-    } for c in candidates]
-    return jsonify(results), 200
-@app.route('/admin/login', methods=['POST', 'OPTIONS'])
-def admin_login():
-    if request.method == 'OPTIONS':
-        # Handle CORS preflight
-        return jsonify({}), 200
-    data = request.get_json()
-    if not data or not all(k in data for k in ("email", "password")):
-        return jsonify({"message": "Missing data"}), 400
-
-    user = EndUser.query.filter_by(email=data['email'], role='admin').first()
-    if user and check_password_hash(user.password_hash, data['password']):
-        access_token = create_access_token(identity=str(user.student_id), expires_delta=timedelta(hours=1))
-        return jsonify({"access_token": access_token, "student_id": user.student_id, "role": user.role}), 200
-    return jsonify({"message": "Invalid credentials or not an admin"}), 401
-
-@app.route('/promote_user', methods=["POST"])
-@jwt_required()
-@role_required('admin')
-def promote_user():
-    data = request.get_json()
-    if not data or not all(k in data for k in ("email", "role")):
-        return jsonify({"message": "Missing data"}), 400
-
-    user = EndUser.query.filter_by(email=data['email']).first()
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-
-    user.role = data['role']
-    db.session.commit()
-    return jsonify({"message": f"{user.email} promoted to {user.role}"}), 200
-
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({"message": "Not found"}), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    db.session.rollback()
-    return jsonify({"message": "Internal server error"}), 500
-
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
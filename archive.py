@@ -0,0 +1,195 @@
+import csv
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, select
+
+from models import db, Election, Vote, VotingSession
+
+COLUMNS = ['id', 'student_id', 'election_id', 'position_id', 'candidate_id', 'vote_time']
+
+
+def archive_dir(election_id):
+    return os.path.join(current_app.config['ARCHIVE_DIR'], f'election-{election_id}')
+
+
+def closed_elections(grace=timedelta(0)):
+    """Elections whose voting ended before ``now - grace`` and are not archived yet."""
+    cutoff = datetime.utcnow() - grace
+    still_open = select(VotingSession.election_id).where(VotingSession.status == 'open')
+    return Election.query.filter(
+        Election.end_time < cutoff,
+        Election.status != 'archived',
+        Election.id.not_in(still_open),
+    ).all()
+
+
+def _vote_batches(election_id, batch_size):
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*[getattr(Vote, c) for c in COLUMNS])
+            .where(Vote.election_id == election_id, Vote.id > last_id)
+            .order_by(Vote.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _write_parquet(path, election_id, batch_size):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()), ('student_id', pa.int64()), ('election_id', pa.int32()),
+        ('position_id', pa.int32()), ('candidate_id', pa.int32()), ('vote_time', pa.timestamp('us')),
+    ])
+    count = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for rows in _vote_batches(election_id, batch_size):
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays([pa.array(col) for col in columns], schema=schema))
+            count += len(rows)
+    return count
+
+
+def _write_csv(path, election_id, batch_size):
+    count = 0
+    with gzip.open(path, 'wt', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for rows in _vote_batches(election_id, batch_size):
+            writer.writerows(
+                [r.id, r.student_id, r.election_id, r.position_id, r.candidate_id,
+                 r.vote_time.isoformat() if r.vote_time else '']
+                for r in rows
+            )
+            count += len(rows)
+    return count
+
+
+def _tallies(election_id):
+    rows = db.session.execute(
+        select(Vote.position_id, Vote.candidate_id, func.count())
+        .where(Vote.election_id == election_id)
+        .group_by(Vote.position_id, Vote.candidate_id)
+    ).all()
+    return [{"position_id": p, "candidate_id": c, "votes": n} for p, c, n in rows]
+
+
+def _replace_atomically(path, write):
+    tmp = path + '.tmp'
+    try:
+        result = write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return result
+
+
+def _write_archive(election, batch_size):
+    target = archive_dir(election.id)
+    os.makedirs(target, exist_ok=True)
+    try:
+        import pyarrow  # noqa: F401
+        filename = 'votes.parquet'
+        writer = _write_parquet
+    except ImportError:
+        filename = 'votes.csv.gz'
+        writer = _write_csv
+
+    tallies = _tallies(election.id)
+    count = _replace_atomically(os.path.join(target, filename),
+                                lambda path: writer(path, election.id, batch_size))
+    manifest = {
+        "election_id": election.id,
+        "title": election.title,
+        "archived_at": datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+        "file": filename,
+        "vote_count": count,
+        "tallies": tallies,
+    }
+
+    def write_manifest(path):
+        with open(path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+    _replace_atomically(os.path.join(target, 'manifest.json'), write_manifest)
+    return manifest
+
+
+def archive_election(election_id, batch_size=None, report=None):
+    """Move a closed election's ballots out of ``votes`` into cold storage.
+
+    Ballots are written to ``ARCHIVE_DIR/election-<id>/`` as Parquet when
+    pyarrow is installed and gzipped CSV otherwise, next to a manifest with the
+    per-candidate tallies. ``Candidate.votes`` is left alone, so the results
+    endpoints keep working once the rows are gone from the hot table.
+
+    Files are written under temporary names and renamed into place, the
+    manifest last, and the election is marked ``archiving`` before any ballot
+    is deleted. A run that stops during the delete is resumed by running it
+    again: it finds the manifest and only finishes the delete, so the archive
+    is never rewritten from the rows that are left.
+    """
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    election = db.session.get(Election, election_id)
+    if election is None:
+        raise ValueError(f"Election {election_id} not found")
+    if election.status == 'archived':
+        raise ValueError(f"Election {election_id} is already archived")
+
+    manifest = archived_manifest(election_id)
+    if manifest is None:
+        if election.status == 'archiving':
+            raise RuntimeError(f"Election {election_id} is being archived but has no manifest")
+        manifest = _write_archive(election, batch_size)
+    count = manifest['vote_count']
+
+    election.status = 'archiving'
+    db.session.commit()
+
+    # Delete in chunks so the partition is never locked for long.
+    deleted = 0
+    for rows in _vote_batches(election_id, batch_size):
+        db.session.execute(delete(Vote).where(Vote.id.in_([r.id for r in rows])))
+        db.session.commit()
+        deleted += len(rows)
+        if report:
+            report(archived=count, deleted=deleted)
+
+    election.status = 'archived'
+    db.session.commit()
+    return manifest
+
+
+def archived_manifest(election_id):
+    path = os.path.join(archive_dir(election_id), 'manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def archived_votes(election_id):
+    """Yield archived ballots of an election as dicts."""
+    manifest = archived_manifest(election_id)
+    if manifest is None:
+        return
+    path = os.path.join(archive_dir(election_id), manifest['file'])
+    if manifest['file'].endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+    else:
+        with gzip.open(path, 'rt', newline='') as f:
+            for row in csv.DictReader(f):
+                yield {k: (int(v) if k != 'vote_time' else v) for k, v in row.items()}
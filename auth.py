@@ -0,0 +1,128 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_jwt_extended import JWTManager, get_jwt_identity
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from cache import cache, LocalCache
+from models import db, EndUser, RevokedToken
+
+
+class CachedJWTManager(JWTManager):
+    """JWTManager that remembers tokens it has already verified.
+
+    Clients poll with the same bearer token, so re-checking its HMAC on every
+    request is wasted work. Verified claims are cached by token digest until
+    the token's ``exp``; the blocklist is still consulted on every request by
+    flask-jwt-extended itself, so caching never delays a revocation.
+    """
+
+    def __init__(self, app=None, **kwargs):
+        self.verified = LocalCache(maxsize=4096, ttl=60)
+        super().__init__(app, **kwargs)
+
+    def init_app(self, app, **kwargs):
+        super().init_app(app, **kwargs)
+        self.verified.configure(maxsize=app.config['JWT_DECODE_CACHE_SIZE'])
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        if csrf_value is not None or allow_expired or not self.verified.maxsize:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        key = hashlib.sha256(encoded_token.encode()).digest()
+        claims = self.verified.get(key)
+        now = time.time()
+        if claims is not None and claims.get('exp', 0) > now:
+            return dict(claims)
+
+        claims = super()._decode_jwt_from_config(encoded_token)
+        if 'exp' in claims:
+            self.verified.set(key, claims, ttl=claims['exp'] - now)
+        return dict(claims)
+
+
+class RevocationList:
+    """Per-worker copy of the unexpired rows of ``revoked_tokens``.
+
+    Revocations made by this worker apply at once; ones made elsewhere are
+    picked up within ``JWT_REVOCATION_REFRESH`` seconds. Each refresh reads
+    the whole unexpired set rather than rows past the last id seen, since a
+    lower id can commit after a higher one; the set is small because rows
+    only live as long as their token.
+    """
+
+    def __init__(self):
+        self._jtis = {}
+        self._next_refresh = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        now = datetime.utcnow()
+        rows = db.session.execute(
+            select(RevokedToken.jti, RevokedToken.expires_at).where(RevokedToken.expires_at > now)
+        ).all()
+        with self._lock:
+            # Merge rather than replace, so a revoke() that committed after
+            # this query started is not forgotten.
+            self._jtis.update(rows)
+            for jti in [j for j, expires in self._jtis.items() if expires <= now]:
+                del self._jtis[jti]
+
+    def is_revoked(self, jti):
+        if time.monotonic() >= self._next_refresh:
+            self._next_refresh = time.monotonic() + current_app.config['JWT_REVOCATION_REFRESH']
+            self._refresh()
+        return jti in self._jtis
+
+    def revoke(self, claims):
+        expires_at = datetime.fromtimestamp(claims['exp'], timezone.utc).replace(tzinfo=None)
+        db.session.add(RevokedToken(
+            jti=claims['jti'],
+            token_type=claims['type'],
+            student_id=int(claims['sub']),
+            expires_at=expires_at,
+        ))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+        with self._lock:
+            self._jtis[claims['jti']] = expires_at
+
+
+jwt = CachedJWTManager()
+revocations = RevocationList()
+
+
+@jwt.token_in_blocklist_loader
+def _token_revoked(jwt_header, jwt_payload):
+    return revocations.is_revoked(jwt_payload['jti'])
+
+
+def user_role(student_id):
+    def load():
+        user = EndUser.query.get(student_id)
+        return user.role if user else None
+    return cache.get_or_load(f'role:{student_id}', load)
+
+
+def forget_user_role(student_id):
+    cache.delete(f'role:{student_id}')
+
+
+# Role check decorator
+def role_required(required_role):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            user_id = int(get_jwt_identity())
+            if user_role(user_id) == required_role:
+                return fn(*args, **kwargs)
+            return jsonify({"message": "Forbidden: Insufficient privileges"}), 403
+        return wrapper
+    return decorator
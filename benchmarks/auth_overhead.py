@@ -0,0 +1,65 @@
+"""Per-request cost of @jwt_required(), with and without the decoded-token cache.
+
+    python benchmarks/auth_overhead.py [--requests 5000]
+
+Runs a no-op view through the Flask test client three ways: unprotected,
+protected with JWT_DECODE_CACHE_SIZE=0 and protected with the cache on, and
+prints the mean time per request and the auth overhead of each.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token, jwt_required  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+
+
+def build(cache_size):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'JWT_DECODE_CACHE_SIZE': cache_size,
+        'WARMUP_ENABLED': False,
+        'RECEIPTS_ENABLED': False,
+        'JOBS_IN_WEB': False,
+    }, with_migrations=False)
+    app.add_url_rule('/_open', 'open', lambda: '')
+    app.add_url_rule('/_protected', 'protected', jwt_required()(lambda: ''))
+    with app.app_context():
+        db.create_all()
+        token = create_access_token(identity='1')
+    return app, {'Authorization': f'Bearer {token}'}
+
+
+def mean_request_time(app, path, headers, requests):
+    client = app.test_client()
+    for _ in range(100):
+        client.get(path, headers=headers)
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get(path, headers=headers)
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    app, headers = build(cache_size=0)
+    baseline = mean_request_time(app, '/_open', headers, args.requests)
+    uncached = mean_request_time(app, '/_protected', headers, args.requests)
+    app, headers = build(cache_size=4096)
+    cached = mean_request_time(app, '/_protected', headers, args.requests)
+
+    print(f"{'unprotected':>18}: {baseline * 1e6:8.1f} us/request")
+    for label, value in (('jwt, no cache', uncached), ('jwt, cached', cached)):
+        print(f"{label:>18}: {value * 1e6:8.1f} us/request  (auth overhead {(value - baseline) * 1e6:7.1f} us)")
+
+
+if __name__ == '__main__':
+    main()
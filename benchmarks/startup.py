@@ -0,0 +1,60 @@
+"""Cold-start benchmark: time from spawning a worker process to its first response.
+
+    python benchmarks/startup.py [--runs 10] [--budget 1.0]
+
+Each run starts a fresh interpreter that imports ``serve`` (the web worker
+entry point) and answers one request through the test client. Exits non-zero
+when the median time-to-first-request is over ``--budget`` seconds.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+t0 = time.perf_counter()
+from serve import app
+t1 = time.perf_counter()
+response = app.test_client().get('/positions')
+t2 = time.perf_counter()
+print(json.dumps({"import_and_create": t1 - t0, "first_request": t2 - t1, "status": response.status_code}))
+"""
+
+
+def run_once():
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    total = time.perf_counter() - start
+    result = json.loads(out.strip().splitlines()[-1])
+    result['total'] = total
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=1.0)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    for key in ('import_and_create', 'first_request', 'total'):
+        values = [r[key] * 1000 for r in runs]
+        print(f"{key:>18}: median {statistics.median(values):7.1f} ms  max {max(values):7.1f} ms")
+
+    median = statistics.median(r['total'] for r in runs)
+    if median > args.budget:
+        print(f"time-to-first-request {median:.3f}s is over the {args.budget:.3f}s budget")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
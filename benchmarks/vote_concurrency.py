@@ -0,0 +1,208 @@
+"""Fire parallel /vote requests and check that no ballot is lost or doubled.
+
+    python benchmarks/vote_concurrency.py [--database-url URL] [--rounds 3]
+        [--voters 200] [--positions 3] [--candidates 4] [--attempts 3]
+        [--threads 16] [--processes 4] [--seed 0]
+
+Each round generates a random ballot stream: every voter submits each
+position ``--attempts`` times (for random candidates), shuffled, so the same
+ballot races itself. The stream is sent through a thread pool and then,
+with a fresh election, through a process pool. After each run it checks:
+
+- each (student_id, election_id, position_id) has exactly one vote,
+- exactly one submission per ballot got 201 and the rest 400,
+- every ``Candidate.votes`` equals its row count in ``votes``,
+
+and prints throughput. Exits non-zero on the first violation. Defaults to a
+throwaway SQLite file; pass ``--database-url`` to run against PostgreSQL or
+MySQL (the tables are created if missing, nothing is dropped).
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, Candidate, Election, EndUser, Position, Vote, VotingSession  # noqa: E402
+from warmup import NAIROBI  # noqa: E402
+
+_app = None
+
+
+def build(database_url):
+    config = {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'WARMUP_ENABLED': False,
+        'RECEIPTS_ENABLED': False,
+        'JOBS_IN_WEB': False,
+        'FRAUD_ENABLED': False,
+    }
+    if database_url.startswith('sqlite'):
+        # Let writers queue on SQLite's database lock instead of failing.
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 60}}
+    return create_app(config, with_migrations=False)
+
+
+def setup_election(app, voters, positions, candidates, tag):
+    """Create an open election plus ``voters`` users; return (election, ballots)."""
+    with app.app_context():
+        now = datetime.now(NAIROBI).replace(tzinfo=None)
+        election = Election(title=f'concurrency {tag}', description='benchmark',
+                            start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=1))
+        db.session.add(election)
+        db.session.flush()
+        db.session.add(VotingSession(election_id=election.id, status='open',
+                                     start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=1)))
+        ballot = {}
+        for p in range(positions):
+            position = Position(name=f'position {p}', election_id=election.id)
+            db.session.add(position)
+            db.session.flush()
+            rows = [Candidate(name=f'candidate {p}.{c}', election_id=election.id,
+                              position_id=position.id, votes=0) for c in range(candidates)]
+            db.session.add_all(rows)
+            db.session.flush()
+            ballot[position.id] = [c.id for c in rows]
+        users = [EndUser(name=f'voter {tag}.{i}', email=f'bench-{tag}-{i}@usiu.ac.ke',
+                         school_id=f'bench-{tag}-{i}', password_hash='-', role='voter')
+                 for i in range(voters)]
+        db.session.add_all(users)
+        db.session.commit()
+        tokens = {u.student_id: create_access_token(identity=str(u.student_id)) for u in users}
+        return election.id, ballot, tokens
+
+
+def ballot_stream(rng, election_id, ballot, tokens, attempts):
+    stream = [
+        (student_id, token, {"election_id": election_id, "position_id": position_id,
+                             "candidate_id": rng.choice(candidate_ids)})
+        for student_id, token in tokens.items()
+        for position_id, candidate_ids in ballot.items()
+        for _ in range(attempts)
+    ]
+    rng.shuffle(stream)
+    return stream
+
+
+def _init_worker(database_url):
+    global _app
+    _app = build(database_url)
+
+
+def _submit(item):
+    student_id, token, body = item
+    response = _app.test_client().post('/vote', json=body, headers={'Authorization': f'Bearer {token}'})
+    return student_id, body["position_id"], response.status_code
+
+
+def run_threads(app, stream, threads):
+    global _app
+    _app = app
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(_submit, stream))
+
+
+def run_processes(database_url, stream, processes):
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(processes, initializer=_init_worker, initargs=(database_url,)) as pool:
+        return pool.map(_submit, stream, chunksize=16)
+
+
+def check(app, election_id, results):
+    """Return a list of invariant violations (empty when all is well)."""
+    problems = []
+    statuses = Counter(status for _, _, status in results)
+    unexpected = {s: n for s, n in statuses.items() if s not in (201, 400)}
+    if unexpected:
+        problems.append(f"unexpected statuses {unexpected}")
+
+    accepted = Counter((student_id, position_id) for student_id, position_id, status in results if status == 201)
+    attempted = {(student_id, position_id) for student_id, position_id, _ in results}
+    doubles = [key for key, n in accepted.items() if n > 1]
+    if doubles:
+        problems.append(f"{len(doubles)} ballots accepted more than once, e.g. {doubles[:3]}")
+    missing = attempted - set(accepted)
+    if missing and not unexpected:
+        problems.append(f"{len(missing)} ballots never accepted, e.g. {sorted(missing)[:3]}")
+
+    with app.app_context():
+        per_ballot = db.session.execute(
+            select(Vote.student_id, Vote.position_id, func.count())
+            .where(Vote.election_id == election_id)
+            .group_by(Vote.student_id, Vote.position_id)
+        ).all()
+        stored = {(s, p): n for s, p, n in per_ballot}
+        duplicated = [key for key, n in stored.items() if n != 1]
+        if duplicated:
+            problems.append(f"{len(duplicated)} ballots stored more than once, e.g. {duplicated[:3]}")
+        if set(stored) != set(accepted):
+            problems.append(f"{len(set(stored) ^ set(accepted))} ballots differ between 201s and the votes table")
+
+        counted = dict(db.session.execute(
+            select(Vote.candidate_id, func.count()).where(Vote.election_id == election_id)
+            .group_by(Vote.candidate_id)
+        ).all())
+        tallies = db.session.execute(
+            select(Candidate.id, Candidate.votes).where(Candidate.election_id == election_id)
+        ).all()
+        drift = [(cid, votes, counted.get(cid, 0)) for cid, votes in tallies if votes != counted.get(cid, 0)]
+        if drift:
+            problems.append(f"{len(drift)} candidate tallies disagree with votes, e.g. {drift[:3]}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--voters', type=int, default=200)
+    parser.add_argument('--positions', type=int, default=3)
+    parser.add_argument('--candidates', type=int, default=4)
+    parser.add_argument('--attempts', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/concurrency.db"
+    app = build(database_url)
+    with app.app_context():
+        db.create_all()
+
+    run_tag = f"{int(time.time())}-{args.seed}"
+    failed = False
+    for round_no in range(args.rounds):
+        rng = random.Random(args.seed + round_no)
+        modes = [('threads', lambda s: run_threads(app, s, args.threads))]
+        if args.processes:
+            modes.append(('processes', lambda s: run_processes(database_url, s, args.processes)))
+        for mode, run in modes:
+            election_id, ballot, tokens = setup_election(
+                app, args.voters, args.positions, args.candidates, f"{run_tag}-{round_no}-{mode}")
+            stream = ballot_stream(rng, election_id, ballot, tokens, args.attempts)
+            start = time.perf_counter()
+            results = run(stream)
+            elapsed = time.perf_counter() - start
+            problems = check(app, election_id, results)
+            statuses = dict(sorted(Counter(status for _, _, status in results).items()))
+            print(f"round {round_no} {mode:>9}: {len(stream)} submissions in {elapsed:.2f}s "
+                  f"({len(stream) / elapsed:,.0f}/s) {statuses} -> {'FAIL' if problems else 'ok'}")
+            for problem in problems:
+                print(f"    {problem}")
+            failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Memory and speed of the has-voted bitmaps (voted.py) for a large electorate.
+
+    python benchmarks/voted_bitmap.py [--students 100000] [--positions 5]
+
+Marks every student as having voted for every position, then prints the
+bitmap memory next to what a set of (student_id, position_id) tuples would
+take, the cost of a has_voted lookup and of a turnout popcount.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voted import ElectionBitmaps  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--positions', type=int, default=5)
+    args = parser.parse_args()
+    students = range(1, args.students + 1)
+
+    tracemalloc.start()
+    bitmaps = ElectionBitmaps()
+    for position_id in range(1, args.positions + 1):
+        for student_id in students:
+            bitmaps.mark(position_id, student_id)
+    bitmap_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    as_set = {(s, p) for p in range(1, args.positions + 1) for s in students}
+    set_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del as_set
+
+    lookups = 200000
+    start = time.perf_counter()
+    for i in range(lookups):
+        bitmaps.has_voted(1 + i % args.positions, 1 + i % args.students)
+    lookup = (time.perf_counter() - start) / lookups
+
+    popcount = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        voters = bitmaps.count()
+        popcount = min(popcount, time.perf_counter() - start)
+
+    print(f"{args.students} students x {args.positions} positions")
+    print(f"  bitmaps:        {bitmap_bytes / 1024:10.1f} KiB ({bitmaps.memory_bytes() / 1024:.1f} KiB of bits)")
+    print(f"  set of tuples:  {set_bytes / 1024:10.1f} KiB")
+    print(f"  has_voted:      {lookup * 1e9:10.0f} ns")
+    print(f"  turnout:        {popcount * 1e3:10.2f} ms ({voters} voters)")
+
+
+if __name__ == '__main__':
+    main()
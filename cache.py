@@ -0,0 +1,341 @@
+import json
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import urlparse
+
+MISSING = object()
+INVALIDATION_CHANNEL = 'cache-invalidate'
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCache:
+    """Thread-safe in-process LRU cache with per-entry TTL.
+
+    ``get_or_load`` is single-flight: when several threads miss on the same key
+    at once, one of them runs the loader and the others wait for its result.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def configure(self, maxsize=None, ttl=None):
+        if maxsize is not None:
+            self.maxsize = maxsize
+        if ttl is not None:
+            self.ttl = ttl
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Return the cached value for ``key``, calling ``loader()`` on a miss.
+
+        ``None`` results are returned but not cached.
+        """
+        value = self.get(key, MISSING)
+        if value is not MISSING:
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            return flight.wait()
+
+        try:
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl)
+            flight.resolve(value)
+            return value
+        except BaseException as e:
+            flight.fail(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+class _Flight:
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def resolve(self, value):
+        self._value = value
+        self._done.set()
+
+    def fail(self, error):
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+def _encode(value):
+    return json.dumps(value, default=_encode_default)
+
+
+def _encode_default(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot cache {type(value).__name__}")
+
+
+def _decode(raw):
+    return json.loads(raw, object_hook=_decode_hook)
+
+
+def _decode_hook(obj):
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+class StandInBackend:
+    """Client for cache_server.py (``tcp://host:port``)."""
+
+    def __init__(self, host, port, timeout=0.5):
+        self.address = (host, port)
+        self.timeout = timeout
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _request(self, payload):
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._conn is None:
+                        sock = socket.create_connection(self.address, self.timeout)
+                        self._conn = (sock, sock.makefile('rwb'))
+                    _, stream = self._conn
+                    stream.write((json.dumps(payload) + '\n').encode())
+                    stream.flush()
+                    line = stream.readline()
+                    if not line:
+                        raise ConnectionError("cache server closed the connection")
+                    return json.loads(line)
+                except OSError:
+                    self._close()
+                    if attempt == 2:
+                        raise
+
+    def _close(self):
+        if self._conn is not None:
+            sock, stream = self._conn
+            self._conn = None
+            for resource in (stream, sock):
+                try:
+                    resource.close()
+                except OSError:
+                    pass
+
+    def get(self, key):
+        reply = self._request({"op": "get", "key": key})
+        return _decode(reply["value"]) if reply["hit"] else MISSING
+
+    def set(self, key, value, ttl):
+        self._request({"op": "set", "key": key, "value": _encode(value), "ttl": ttl})
+
+    def delete(self, keys):
+        self._request({"op": "delete", "keys": list(keys)})
+
+    def publish(self, channel, message):
+        self._request({"op": "publish", "channel": channel, "message": message})
+
+    def listen(self, channel, callback):
+        """Block forever, calling ``callback(message)`` for each publish."""
+        with socket.create_connection(self.address) as sock, sock.makefile('rwb') as stream:
+            stream.write((json.dumps({"op": "subscribe", "channel": channel}) + '\n').encode())
+            stream.flush()
+            stream.readline()
+            for line in stream:
+                callback(json.loads(line)["message"])
+
+
+class RedisBackend:
+    """Redis (``redis://...``); needs the optional ``redis`` package."""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return MISSING if raw is None else _decode(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, _encode(value), ex=max(1, int(ttl)))
+
+    def delete(self, keys):
+        self.client.delete(*keys)
+
+    def publish(self, channel, message):
+        self.client.publish(channel, message)
+
+    def listen(self, channel, callback):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        for item in pubsub.listen():
+            callback(item["data"].decode())
+
+
+def backend_from_url(url):
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme == 'tcp':
+        return StandInBackend(parsed.hostname, parsed.port)
+    if parsed.scheme in ('redis', 'rediss'):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported CACHE_URL scheme: {parsed.scheme!r}")
+
+
+class Cache:
+    """The cache used by the app: a LocalCache, optionally backed by a shared one.
+
+    Reads go local -> shared -> loader. ``delete`` also publishes the keys on
+    the invalidation channel, and every worker drops them from its local
+    cache, so a change is visible everywhere within the pub/sub latency
+    (or ``CACHE_TTL`` at worst, if a worker missed the message). If the shared
+    backend is unreachable we log it and carry on with the local cache.
+    """
+
+    def __init__(self):
+        self.local = LocalCache()
+        self.shared = None
+        self.retry_after = 5
+        self._shared_down_until = 0
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def configure(self, maxsize=None, ttl=None, shared=None):
+        self.local.configure(maxsize=maxsize, ttl=ttl)
+        self.shared = shared
+
+    def _shared_call(self, method, *args):
+        if self.shared is None or time.monotonic() < self._shared_down_until:
+            return MISSING
+        try:
+            return getattr(self.shared, method)(*args)
+        except Exception:
+            # Don't make every request wait on a dead server's connect timeout.
+            self._shared_down_until = time.monotonic() + self.retry_after
+            logger.warning("Shared cache %s failed", method, exc_info=True)
+            return MISSING
+
+    def get(self, key, default=None):
+        value = self.local.get(key, MISSING)
+        if value is MISSING:
+            value = self._shared_call('get', key)
+            if value is MISSING:
+                return default
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.local.set(key, value, ttl)
+        self._shared_call('set', key, value, self.local.ttl if ttl is None else ttl)
+
+    def get_or_load(self, key, loader, ttl=None):
+        def load():
+            value = self._shared_call('get', key)
+            if value is MISSING:
+                value = loader()
+                if value is not None:
+                    self._shared_call('set', key, value, self.local.ttl if ttl is None else ttl)
+            return value
+        return self.local.get_or_load(key, load, ttl)
+
+    def delete(self, *keys):
+        self.local.delete(*keys)
+        self._shared_call('delete', keys)
+        self._shared_call('publish', INVALIDATION_CHANNEL, json.dumps(list(keys)))
+
+    def clear(self):
+        self.local.clear()
+
+    def publish(self, channel, message):
+        """Publish on the shared backend; False if there is none or it is down."""
+        return self._shared_call('publish', channel, message) is not MISSING
+
+    def _on_invalidate(self, message):
+        self.local.delete(*json.loads(message))
+
+    def _listen(self):
+        while True:
+            try:
+                self.shared.listen(INVALIDATION_CHANNEL, self._on_invalidate)
+            except Exception:
+                logger.warning("Cache invalidation listener disconnected", exc_info=True)
+            # Anything published while we were away is bounded by the local TTL;
+            # drop everything so we don't rely on it.
+            self.local.clear()
+            time.sleep(1)
+
+    def start_listener(self):
+        if self.shared is None:
+            return
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+            self._listener.start()
+
+
+cache = Cache()
+
+
+def init_app(app):
+    cache.configure(
+        maxsize=app.config['CACHE_MAXSIZE'],
+        ttl=app.config['CACHE_TTL'],
+        shared=backend_from_url(app.config['CACHE_URL']),
+    )
+
+    @app.before_request
+    def _start_cache_listener():
+        cache.start_listener()
@@ -0,0 +1,110 @@
+"""Minimal shared cache + pub/sub server.
+
+A local stand-in for Redis so several workers (or a test) can share cache
+entries and invalidation messages without extra infrastructure:
+
+    python cache_server.py --port 6390
+    CACHE_URL=tcp://127.0.0.1:6390 flask run
+
+The protocol is one JSON object per line. Requests carry an ``op``
+(``get``, ``set``, ``delete``, ``publish`` or ``subscribe``) and get one JSON
+reply; after ``subscribe`` the connection only receives
+``{"channel": ..., "message": ...}`` lines.
+"""
+import argparse
+import json
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self._write_lock = threading.Lock()
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                reply = self.server.dispatch(request, self)
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            if reply is None:
+                # Subscribed: keep the socket open for pushes until it closes.
+                self.rfile.read()
+                return
+            self._send(reply)
+
+    def _send(self, payload):
+        with self._write_lock:
+            self.wfile.write((json.dumps(payload) + '\n').encode())
+            self.wfile.flush()
+
+
+class CacheServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, _Handler)
+        self._data = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def dispatch(self, request, handler):
+        op = request['op']
+        if op == 'get':
+            with self._lock:
+                entry = self._data.get(request['key'])
+                if entry and entry[1] < time.monotonic():
+                    del self._data[request['key']]
+                    entry = None
+            return {"ok": True, "hit": entry is not None, "value": entry[0] if entry else None}
+        if op == 'set':
+            with self._lock:
+                self._data[request['key']] = (request['value'], time.monotonic() + request['ttl'])
+            return {"ok": True}
+        if op == 'delete':
+            with self._lock:
+                for key in request['keys']:
+                    self._data.pop(key, None)
+            return {"ok": True}
+        if op == 'publish':
+            return {"ok": True, "receivers": self.publish(request['channel'], request['message'])}
+        if op == 'subscribe':
+            with self._lock:
+                self._subscribers.setdefault(request['channel'], []).append(handler)
+            handler._send({"ok": True})
+            return None
+        raise ValueError(f"Unknown op {op!r}")
+
+    def publish(self, channel, message):
+        with self._lock:
+            handlers = list(self._subscribers.get(channel, []))
+        delivered = 0
+        for handler in handlers:
+            try:
+                handler._send({"channel": channel, "message": message})
+                delivered += 1
+            except OSError:
+                with self._lock:
+                    self._subscribers[channel].remove(handler)
+        return delivered
+
+
+def start_server(host='127.0.0.1', port=0):
+    """Run a server in a background thread; returns it (``server.server_address``)."""
+    server = CacheServer((host, port))
+    threading.Thread(target=server.serve_forever, name='cache-server', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args()
+    with CacheServer((args.host, args.port)) as server:
+        print(f"Cache server listening on {args.host}:{args.port}")
+        server.serve_forever()
@@ -0,0 +1,116 @@
+"""Name search over an election's candidates for typeahead.
+
+Each cached ballot gets an in-memory index: a sorted list of the words in
+candidate names for prefix lookups (bisect), plus trigram postings for
+"contains" matches. Matching never touches the database, so it takes well
+under a millisecond even for ballots with thousands of candidates; the view
+only reads the live vote tallies, which the cached ballot doesn't follow.
+``name_clauses`` gives the same matching as SQL for the database fallback,
+and both order ties by id, so a query pages the same way either way.
+"""
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from sqlalchemy import and_, func, or_
+
+ORDERINGS = {
+    'id': (lambda c: c['id'], False),
+    'name': (lambda c: c['name'].lower(), False),
+    '-name': (lambda c: c['name'].lower(), True),
+    'votes': (lambda c: c['votes'] or 0, False),
+    '-votes': (lambda c: c['votes'] or 0, True),
+}
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _trigrams(text):
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class CandidateIndex:
+    def __init__(self, candidates):
+        self.candidates = candidates
+        self.names = [c['name'].lower() for c in candidates]
+        self.words = sorted(
+            (word, i) for i, name in enumerate(self.names) for word in name.split()
+        )
+        self.positions = defaultdict(set)
+        for i, c in enumerate(candidates):
+            self.positions[str(c['position_id'])].add(i)
+        self.postings = defaultdict(set)
+        for i, name in enumerate(self.names):
+            for gram in _trigrams(name):
+                self.postings[gram].add(i)
+
+    def _prefix(self, term):
+        matches = set()
+        start = bisect_left(self.words, (term,))
+        for word, i in self.words[start:]:
+            if not word.startswith(term):
+                break
+            matches.add(i)
+        return matches
+
+    def _contains(self, term):
+        grams = _trigrams(term.strip()) if len(term) >= 3 else set()
+        grams = {g for g in grams if not g.startswith(' ') and not g.endswith(' ')}
+        if grams:
+            candidates = set.intersection(*(self.postings.get(g, set()) for g in grams))
+        else:
+            candidates = range(len(self.names))
+        return {i for i in candidates if term in self.names[i]}
+
+    def search(self, query, position_id=None):
+        """Indexes of candidates whose words start with every term of ``query``,
+        falling back to a substring match when nothing starts with it.
+
+        ``position_id`` narrows the candidates before that choice is made, so a
+        prefix match elsewhere on the ballot can't hide this position's ones.
+        """
+        if position_id:
+            scope = self.positions.get(str(position_id), set())
+        else:
+            scope = set(range(len(self.candidates)))
+        terms = query.lower().split() if query else []
+        if not terms:
+            return sorted(scope)
+        matches = set.intersection(scope, *(self._prefix(t) for t in terms))
+        if not matches:
+            matches = scope & self._contains(query.lower().strip())
+        return sorted(matches)
+
+
+def name_clauses(column, query):
+    """SQL versions of ``CandidateIndex.search``: (word-prefix clause, contains clause)."""
+    name = func.lower(column)
+    terms = query.lower().split()
+    prefix = and_(*(or_(name.startswith(t, autoescape=True), name.contains(' ' + t, autoescape=True))
+                    for t in terms))
+    return prefix, name.contains(query.lower().strip(), autoescape=True)
+
+
+def index_for(election_id, ballot):
+    """The index for this exact ballot dict, rebuilt whenever the ballot is reloaded."""
+    with _lock:
+        cached = _indexes.get(election_id)
+        if cached is not None and cached[0] is ballot:
+            return cached[1]
+    index = CandidateIndex(ballot['candidates'])
+    with _lock:
+        _indexes[election_id] = (ballot, index)
+    return index
+
+
+def search(candidates_index, query=None, position_id=None, order='id', votes=None):
+    """Matching candidates in ``order``. ``votes`` maps candidate ids to live
+    tallies, which replace the ones cached with the ballot."""
+    rows = [candidates_index.candidates[i] for i in candidates_index.search(query, position_id)]
+    if votes is not None:
+        rows = [dict(c, votes=votes.get(c['id'], c['votes'])) for c in rows]
+    key, reverse = ORDERINGS[order]
+    # Sorting is stable (also in reverse), so ties stay in ascending id order.
+    return sorted(sorted(rows, key=lambda c: c['id']), key=key, reverse=reverse)
@@ -0,0 +1,204 @@
+"""Anomaly detection over cast votes.
+
+``cast_vote`` only drops an event on an in-process queue; a detector thread
+per worker consumes it and keeps bounded-memory counts over sliding
+windows:
+
+- votes per client IP per election (``ip_burst``),
+- votes per candidate (``candidate_burst``),
+- repeat ballots per account within ``FRAUD_RAPID_WINDOW_SECONDS``
+  (``rapid_ballots``): every attempt counts, including ones rejected as
+  duplicates, less one per position, so an honest voter filling in a long
+  ballot never adds up but a script retrying a position does.
+
+IP and candidate counts live in count-min sketches, so memory stays fixed
+however many distinct keys show up; estimates can only over-count. Alerts
+are written to ``fraud_alerts`` and listed at ``/admin/alerts``. Each worker
+only sees its own share of the traffic, so thresholds are per worker.
+Behind a reverse proxy, set ``PROXY_HOPS`` so the IP is the client's rather
+than the proxy's.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+from models import db, FraudAlert
+
+logger = logging.getLogger(__name__)
+
+_events = queue.Queue(maxsize=10000)
+_thread = None
+_lock = threading.Lock()
+dropped = 0
+
+
+class CountMinSketch:
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+
+    def _cells(self, key):
+        for row in range(self.depth):
+            yield row, hash((row, key)) % self.width
+
+    def add(self, key, count=1):
+        for row, col in self._cells(key):
+            self.rows[row][col] += count
+
+    def estimate(self, key):
+        return min(self.rows[row][col] for row, col in self._cells(key))
+
+
+class SlidingCounter:
+    """Approximate per-key counts over the last ``window`` seconds.
+
+    The window is split into ``buckets`` sketches; the oldest one is dropped
+    as time moves on, so counts expire with a granularity of one bucket.
+    """
+
+    def __init__(self, window, buckets=6, width=2048, depth=4):
+        self.window = window
+        self.span = window / buckets
+        self.buckets = buckets
+        self.width = width
+        self.depth = depth
+        self._sketches = OrderedDict()
+
+    def _rotate(self, now):
+        current = int(now // self.span)
+        while self._sketches and next(iter(self._sketches)) <= current - self.buckets:
+            self._sketches.popitem(last=False)
+        if current not in self._sketches:
+            self._sketches[current] = CountMinSketch(self.width, self.depth)
+        return self._sketches[current]
+
+    def add(self, key, now):
+        self._rotate(now).add(key)
+        return self.estimate(key)
+
+    def estimate(self, key):
+        return sum(sketch.estimate(key) for sketch in self._sketches.values())
+
+
+class Detector:
+    def __init__(self, config):
+        self.ip_votes = SlidingCounter(config['FRAUD_IP_WINDOW_SECONDS'])
+        self.ip_threshold = config['FRAUD_IP_THRESHOLD']
+        self.candidate_votes = SlidingCounter(config['FRAUD_BURST_WINDOW_SECONDS'])
+        self.burst_threshold = config['FRAUD_BURST_THRESHOLD']
+        self.rapid_window = config['FRAUD_RAPID_WINDOW_SECONDS']
+        self.rapid_threshold = config['FRAUD_RAPID_THRESHOLD']
+        self._attempts = OrderedDict()
+        self._attempts_max = 100000
+        self._alerted = {}
+
+    def _alert(self, kind, election_id, subject, count, window, now):
+        # One alert per subject per window, not one per vote past the threshold.
+        key = (kind, election_id, subject)
+        if now - self._alerted.get(key, float('-inf')) < window:
+            return None
+        if len(self._alerted) > 10000:
+            self._alerted = {k: t for k, t in self._alerted.items() if now - t < self.ip_votes.window}
+        self._alerted[key] = now
+        return FraudAlert(kind=kind, election_id=election_id, subject=str(subject),
+                          count=count, window_seconds=window)
+
+    def _rapid(self, event):
+        """Ballots from this account in the last ``rapid_window`` seconds beyond
+        the first one for each position."""
+        key = (event['election_id'], event['student_id'])
+        now = event['time']
+        attempts = self._attempts.pop(key, None) or deque()
+        attempts.append((now, event['position_id']))
+        while attempts[0][0] <= now - self.rapid_window:
+            attempts.popleft()
+        self._attempts[key] = attempts
+        if len(self._attempts) > self._attempts_max:
+            self._attempts.popitem(last=False)
+        return len(attempts) - len({position_id for _, position_id in attempts})
+
+    def observe(self, event):
+        """Count one ballot and return the alerts it triggers.
+
+        Rejected ballots only count towards ``rapid_ballots``.
+        """
+        now = event['time']
+        election_id = event['election_id']
+        alerts = []
+        count = self._rapid(event)
+        if count >= self.rapid_threshold:
+            alerts.append(self._alert('rapid_ballots', election_id, event['student_id'], count,
+                                      self.rapid_window, now))
+        if event['accepted'] and event['ip']:
+            count = self.ip_votes.add((election_id, event['ip']), now)
+            if count >= self.ip_threshold:
+                alerts.append(self._alert('ip_burst', election_id, event['ip'], count,
+                                          self.ip_votes.window, now))
+        if event['accepted']:
+            count = self.candidate_votes.add(event['candidate_id'], now)
+            if count >= self.burst_threshold:
+                alerts.append(self._alert('candidate_burst', election_id, event['candidate_id'], count,
+                                          self.candidate_votes.window, now))
+        return [a for a in alerts if a is not None]
+
+
+def record_vote(student_id, election_id, position_id, candidate_id, ip, accepted=True):
+    """Hand a ballot to the detector. Never blocks; drops events when full.
+
+    Call it with ``accepted=False`` for ballots rejected as duplicates.
+    """
+    global dropped
+    if _thread is None:
+        return
+    try:
+        _events.put_nowait({
+            "student_id": student_id, "election_id": election_id, "position_id": position_id,
+            "candidate_id": candidate_id, "ip": ip, "accepted": accepted,
+            "time": time.monotonic(),
+        })
+    except queue.Full:
+        dropped += 1
+
+
+def _run(app):
+    detector = Detector(app.config)
+    while True:
+        events = [_events.get()]
+        while len(events) < 500:
+            try:
+                events.append(_events.get_nowait())
+            except queue.Empty:
+                break
+        alerts = [alert for event in events for alert in detector.observe(event)]
+        if not alerts:
+            continue
+        with app.app_context():
+            try:
+                db.session.add_all(alerts)
+                db.session.commit()
+            except Exception:
+                logger.exception("Could not store %d fraud alerts", len(alerts))
+            finally:
+                db.session.remove()
+
+
+def start(app):
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_run, args=(app,), name='fraud-detector', daemon=True)
+        _thread.start()
+
+
+def init_app(app):
+    if not app.config['FRAUD_ENABLED']:
+        return
+    _events.maxsize = app.config['FRAUD_QUEUE_SIZE']
+
+    @app.before_request
+    def _start_fraud_detector():
+        start(app)
@@ -0,0 +1,170 @@
+"""Response compression and conditional GETs.
+
+``conditional`` builds a weak ETag from the request and a set of version
+numbers. Each scope's version is a counter in the ``cache_versions`` table
+that is bumped whenever the data behind it changes (``election_changed``,
+``voters_changed``), so a matching ``If-None-Match`` is answered with 304
+before the view runs. Workers keep the numbers in the cache and follow the
+same invalidation as the rest of it: instantly within a worker, via pub/sub
+across workers when a shared cache is configured, and within ``CACHE_TTL``
+otherwise. Reloading an expired entry reads the same number back, so ETags
+only change when the data does, and every worker computes the same ones.
+
+Votes don't bump any version, since that would cost a write, a cache delete
+and a publish per ballot. Views showing live tallies add a ``votes:`` scope
+(``vote_scopes``) whose token is a random string that simply expires every
+``VOTES_FRESHNESS`` seconds, so their ETags change at most that often while
+voting is open.
+
+Everything here sits behind ``@jwt_required``, so responses are ``private``:
+shared proxies must not serve them to other clients.
+"""
+import gzip
+import hashlib
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, make_response, request
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from cache import cache
+from models import db, CacheVersion
+
+# Closed elections' results only change through an admin correction, which
+# then reaches clients within five minutes; revalidating is a cheap 304.
+CLOSED_RESULTS = 'private, max-age=300'
+LIVE_RESULTS = 'private, max-age=5'
+BALLOT = 'private, max-age=30'
+ADMIN = 'private, no-cache'
+
+VOTES_FRESHNESS = 5
+
+COMPRESSIBLE = {'application/json', 'text/plain', 'text/csv', 'text/html'}
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _stored_version(scope):
+    # Always read the primary, so a lagging replica can't hand out an old number.
+    with db.engine.connect() as connection:
+        value = connection.execute(
+            select(CacheVersion.version).where(CacheVersion.scope == scope)
+        ).scalar()
+    return str(value or 0)
+
+
+def version(scope):
+    if scope.startswith('votes:'):
+        return cache.get_or_load(f'etag:{scope}', lambda: uuid.uuid4().hex, ttl=VOTES_FRESHNESS)
+    return cache.get_or_load(f'etag:{scope}', lambda: _stored_version(scope))
+
+
+def _bump(scope):
+    with db.engine.begin() as connection:
+        bumped = connection.execute(
+            update(CacheVersion).where(CacheVersion.scope == scope)
+            .values(version=CacheVersion.version + 1)
+        ).rowcount
+        if not bumped:
+            connection.execute(insert(CacheVersion).values(scope=scope, version=1))
+
+
+def touch(*scopes):
+    """Bump the stored versions of ``scopes``; call after the change is committed."""
+    for scope in scopes:
+        try:
+            _bump(scope)
+        except IntegrityError:
+            # Another worker created the row first; bump that one instead.
+            _bump(scope)
+    cache.delete(*(f'etag:{scope}' for scope in scopes))
+
+
+def election_changed(election_id):
+    touch(f'election:{election_id}', 'elections')
+
+
+def voters_changed():
+    touch('voters')
+
+
+def election_scope(election_id):
+    if election_id is not None and str(election_id).isdigit():
+        return [f'election:{election_id}']
+    return ['elections']
+
+
+def vote_scopes(election_id, final=False):
+    """Scopes for views that show tallies; ``final`` once no more votes can land."""
+    scopes = election_scope(election_id)
+    if not final:
+        scopes.append(f"votes:{election_id if str(election_id).isdigit() else 'all'}")
+    return scopes
+
+
+def _etag(scopes):
+    args = urlencode(sorted(request.args.items(multi=True)))
+    key = '|'.join([request.path, args] + [version(s) for s in scopes])
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def conditional(scopes, cache_control):
+    """Add ETag/Cache-Control to a GET view and answer revalidations with 304.
+
+    ``scopes`` and ``cache_control`` may be callables taking the view's
+    arguments. Goes below the auth decorators, so tokens are still checked.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            names = scopes(**kwargs) if callable(scopes) else scopes
+            policy = cache_control(**kwargs) if callable(cache_control) else cache_control
+            etag = _etag(names)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = policy
+            return response
+        return wrapper
+    return decorator
+
+
+def _encoding():
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress(response):
+    config = current_app.config
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+    encoding = _encoding()
+    if encoding == 'br':
+        data = brotli.compress(data, quality=config['COMPRESS_LEVEL'])
+    elif encoding == 'gzip':
+        data = gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+    else:
+        return response
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    if app.config['COMPRESS_ENABLED']:
+        app.after_request(compress)
@@ -0,0 +1,216 @@
+"""Background jobs for long admin operations.
+
+Jobs live in the ``jobs`` table, so any worker can report on them and any
+runner can pick them up. A runner is a few threads that claim queued jobs
+one at a time. In production run dedicated ones with ``flask run-jobs`` so
+jobs never occupy web workers; ``JOBS_IN_WEB=1`` starts one inside each web
+worker instead, which is handy in development.
+
+Task functions are registered with ``@task('name')`` and called as
+``fn(**params, report=report)``. ``report(**progress)`` stores progress and
+raises ``JobCancelled`` once an admin has asked for the job to stop.
+
+Each runner process touches ``heartbeat_at`` on its running jobs every
+``JOBS_HEARTBEAT_SECONDS``. A running job whose heartbeat is older than
+``JOBS_STALE_SECONDS`` lost its runner (crash, deploy) and is queued again,
+so tasks must be safe to re-run.
+
+Params are stored as plain JSON, so never pass secrets through them.
+"""
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update
+
+from models import db, Job
+
+TASKS = {}
+
+_threads = []
+_heartbeat_thread = None
+_lock = threading.Lock()
+_wakeup = threading.Event()
+# Ids of the jobs this process is running, kept alive by the heartbeat thread.
+_running = set()
+_running_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def task(name):
+    def decorator(fn):
+        TASKS[name] = fn
+        return fn
+    return decorator
+
+
+def enqueue(name, created_by=None, **params):
+    if name not in TASKS:
+        raise ValueError(f"Unknown job {name!r}")
+    job = Job(id=uuid.uuid4().hex, name=name, status='queued',
+              params=json.dumps(params), created_by=created_by)
+    db.session.add(job)
+    db.session.commit()
+    _wakeup.set()
+    return job
+
+
+def cancel(job):
+    """Cancel a queued job now, or ask a running one to stop at its next report."""
+    if job.status == 'queued':
+        job.status = 'cancelled'
+        job.finished_at = datetime.utcnow()
+    elif job.status == 'running':
+        job.cancel_requested = True
+    db.session.commit()
+    return job
+
+
+class _Reporter:
+    """Writes progress on its own connection so it never commits the task's work."""
+
+    def __init__(self, job_id, interval):
+        self.job_id = job_id
+        self.interval = interval
+        self._last = 0
+
+    def __call__(self, **progress):
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        with db.engine.begin() as conn:
+            conn.execute(update(Job).where(Job.id == self.job_id).values(progress=json.dumps(progress)))
+            cancelled = conn.execute(
+                Job.__table__.select().with_only_columns(Job.cancel_requested).where(Job.id == self.job_id)
+            ).scalar()
+        if cancelled:
+            raise JobCancelled()
+
+
+def requeue_stale(stale_seconds):
+    """Recover running jobs whose runner stopped sending heartbeats."""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    stale = Job.query.filter(
+        Job.status == 'running',
+        func.coalesce(Job.heartbeat_at, Job.started_at) < cutoff,
+    ).all()
+    for job in stale:
+        if job.cancel_requested:
+            values = {"status": "cancelled", "finished_at": datetime.utcnow()}
+        else:
+            values = {"status": "queued", "started_at": None, "heartbeat_at": None}
+        # Guarded on the old heartbeat so two runners can't both recover it.
+        Job.query.filter_by(id=job.id, status='running', heartbeat_at=job.heartbeat_at).update(
+            values, synchronize_session=False)
+    db.session.commit()
+    if stale:
+        _wakeup.set()
+    return len(stale)
+
+
+def _claim():
+    while True:
+        job = Job.query.filter_by(status='queued').order_by(Job.created_at).first()
+        if job is None:
+            return None
+        now = datetime.utcnow()
+        claimed = Job.query.filter_by(id=job.id, status='queued').update(
+            {"status": "running", "started_at": now, "heartbeat_at": now}, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job.id, populate_existing=True)
+
+
+def run_next(app):
+    """Claim and run one queued job. Returns False when the queue is empty."""
+    job = _claim()
+    if job is None:
+        return False
+    job_id = job.id
+    with _running_lock:
+        _running.add(job_id)
+    try:
+        _run_job(app, job)
+    finally:
+        with _running_lock:
+            _running.discard(job_id)
+    return True
+
+
+def _run_job(app, job):
+    job_id = job.id
+    fn = TASKS[job.name]
+    params = json.loads(job.params)
+    try:
+        result = fn(**params, report=_Reporter(job_id, app.config['JOBS_PROGRESS_INTERVAL']))
+        values = {"status": "done", "result": json.dumps(result, default=str)}
+    except JobCancelled:
+        db.session.rollback()
+        values = {"status": "cancelled"}
+    except Exception as e:
+        db.session.rollback()
+        app.logger.exception("Job %s (%s) failed", job_id, job.name)
+        values = {"status": "failed", "error": str(e)}
+    values["finished_at"] = datetime.utcnow()
+    Job.query.filter_by(id=job_id).update(values, synchronize_session=False)
+    db.session.commit()
+
+
+def _heartbeat(app):
+    while True:
+        time.sleep(app.config['JOBS_HEARTBEAT_SECONDS'])
+        with _running_lock:
+            running = list(_running)
+        with app.app_context():
+            try:
+                if running:
+                    with db.engine.begin() as conn:
+                        conn.execute(update(Job).where(Job.id.in_(running), Job.status == 'running')
+                                     .values(heartbeat_at=datetime.utcnow()))
+                requeue_stale(app.config['JOBS_STALE_SECONDS'])
+            except Exception:
+                app.logger.exception("Job heartbeat failed")
+            finally:
+                db.session.remove()
+
+
+def _runner(app):
+    while True:
+        with app.app_context():
+            try:
+                while run_next(app):
+                    pass
+            except Exception:
+                app.logger.exception("Job runner error")
+            finally:
+                db.session.remove()
+        _wakeup.wait(app.config['JOBS_POLL_SECONDS'])
+        _wakeup.clear()
+
+
+def start(app, workers=None):
+    global _heartbeat_thread
+    with _lock:
+        _threads[:] = [t for t in _threads if t.is_alive()]
+        for i in range(len(_threads), workers or app.config['JOBS_WORKERS']):
+            thread = threading.Thread(target=_runner, args=(app,), name=f'job-runner-{i}', daemon=True)
+            thread.start()
+            _threads.append(thread)
+        if _heartbeat_thread is None or not _heartbeat_thread.is_alive():
+            _heartbeat_thread = threading.Thread(target=_heartbeat, args=(app,), name='job-heartbeat', daemon=True)
+            _heartbeat_thread.start()
+
+
+def init_app(app):
+    import tasks  # noqa: F401  (registers the tasks)
+
+    if app.config['JOBS_IN_WEB']:
+        @app.before_request
+        def _start_jobs():
+            start(app)
@@ -0,0 +1,118 @@
+"""Partition votes by election_id
+
+Revision ID: 34a4f05940a8
+Revises: 4ce6d4d5c896
+Create Date: 2026-10-19 10:12:41.208113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '34a4f05940a8'
+down_revision = '4ce6d4d5c896'
+branch_labels = None
+depends_on = None
+
+# Hash partitions keep every election's ballots together, so duplicate checks,
+# tallies and archival deletes only touch one partition. The partition key has
+# to be part of every unique key, hence the (id, election_id) primary key.
+PARTITIONS = 16
+
+VOTE_FKS = [
+    ('student_id', 'end_users', 'student_id'),
+    ('election_id', 'elections', 'id'),
+    ('position_id', 'positions', 'id'),
+    ('candidate_id', 'candidates', 'id'),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    with op.batch_alter_table('votes', schema=None) as batch_op:
+        batch_op.create_index('ix_votes_election_id', ['election_id', 'id'], unique=False)
+
+    if bind.dialect.name == 'mysql':
+        _upgrade_mysql(bind)
+    elif bind.dialect.name == 'postgresql':
+        _upgrade_postgresql()
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'mysql':
+        _downgrade_mysql()
+    elif bind.dialect.name == 'postgresql':
+        _downgrade_postgresql()
+
+    with op.batch_alter_table('votes', schema=None) as batch_op:
+        batch_op.drop_index('ix_votes_election_id')
+
+
+def _upgrade_mysql(bind):
+    # InnoDB does not allow foreign keys on partitioned tables.
+    for fk in sa.inspect(bind).get_foreign_keys('votes'):
+        op.drop_constraint(fk['name'], 'votes', type_='foreignkey')
+    op.execute(
+        "ALTER TABLE votes DROP PRIMARY KEY, ADD PRIMARY KEY (id, election_id)"
+    )
+    op.execute(f"ALTER TABLE votes PARTITION BY HASH (election_id) PARTITIONS {PARTITIONS}")
+
+
+def _downgrade_mysql():
+    op.execute("ALTER TABLE votes REMOVE PARTITIONING")
+    op.execute("ALTER TABLE votes DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+    for column, table, remote in VOTE_FKS:
+        op.create_foreign_key(None, 'votes', table, [column], [remote])
+
+
+def _upgrade_postgresql():
+    op.rename_table('votes', 'votes_unpartitioned')
+    op.execute("ALTER INDEX ix_votes_election_id RENAME TO ix_votes_unpartitioned_election_id")
+    op.execute("""
+        CREATE TABLE votes (
+            id INTEGER NOT NULL DEFAULT nextval('votes_id_seq'),
+            student_id INTEGER NOT NULL REFERENCES end_users (student_id),
+            election_id INTEGER NOT NULL REFERENCES elections (id),
+            position_id INTEGER NOT NULL REFERENCES positions (id),
+            candidate_id INTEGER NOT NULL REFERENCES candidates (id),
+            vote_time TIMESTAMP WITHOUT TIME ZONE,
+            PRIMARY KEY (id, election_id),
+            CONSTRAINT unique_vote_partitioned UNIQUE (student_id, election_id, position_id)
+        ) PARTITION BY HASH (election_id)
+    """)
+    for remainder in range(PARTITIONS):
+        op.execute(
+            f"CREATE TABLE votes_p{remainder} PARTITION OF votes "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})"
+        )
+    op.execute("INSERT INTO votes SELECT id, student_id, election_id, position_id, candidate_id, vote_time FROM votes_unpartitioned")
+    op.execute("ALTER SEQUENCE votes_id_seq OWNED BY votes.id")
+    op.drop_table('votes_unpartitioned')
+    op.execute("ALTER TABLE votes RENAME CONSTRAINT unique_vote_partitioned TO unique_vote")
+    op.create_index('ix_votes_election_id', 'votes', ['election_id', 'id'], unique=False)
+
+
+def _downgrade_postgresql():
+    op.rename_table('votes', 'votes_partitioned')
+    op.execute("ALTER TABLE votes_partitioned RENAME CONSTRAINT unique_vote TO unique_vote_partitioned")
+    op.execute("ALTER INDEX ix_votes_election_id RENAME TO ix_votes_partitioned_election_id")
+    op.create_table('votes',
+    sa.Column('id', sa.Integer(), sa.Identity(always=False), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('election_id', sa.Integer(), nullable=False),
+    sa.Column('position_id', sa.Integer(), nullable=False),
+    sa.Column('candidate_id', sa.Integer(), nullable=False),
+    sa.Column('vote_time', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['candidate_id'], ['candidates.id'], ),
+    sa.ForeignKeyConstraint(['election_id'], ['elections.id'], ),
+    sa.ForeignKeyConstraint(['position_id'], ['positions.id'], ),
+    sa.ForeignKeyConstraint(['student_id'], ['end_users.student_id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('student_id', 'election_id', 'position_id', name='unique_vote')
+    )
+    op.execute("INSERT INTO votes SELECT * FROM votes_partitioned")
+    op.execute("SELECT setval(pg_get_serial_sequence('votes', 'id'), COALESCE(MAX(id), 1)) FROM votes")
+    op.drop_table('votes_partitioned')
+    op.create_index('ix_votes_election_id', 'votes', ['election_id', 'id'], unique=False)
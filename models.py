@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
+import json
 from datetime import datetime
+from replica import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class Election(db.Model):
     __tablename__ = 'elections' 
@@ -36,6 +38,7 @@ class Position(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), nullable=False) 
+    ballot_type = db.Column(db.String(20), nullable=False, default='plurality', server_default='plurality')
 
     candidates = db.relationship('Candidate', backref='position', lazy=True)
 
@@ -44,6 +47,7 @@ class Position(db.Model):
             "id": self.id,
             "name": self.name,
             "election_id": self.election_id,
+            "ballot_type": self.ballot_type,
         }
 
 class Candidate(db.Model):
@@ -53,7 +57,10 @@ class Candidate(db.Model):
     election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), nullable=False) 
     position_id = db.Column(db.Integer, db.ForeignKey('positions.id'), nullable=False)  
     votes = db.Column(db.Integer, default=0)
-    
+
+    __table_args__ = (
+        db.Index('ix_candidates_election_id_name', 'election_id', 'name'),
+    )
 
     def to_dict(self):
         return {
@@ -111,9 +118,26 @@ class Vote(db.Model):
     position_id = db.Column(db.Integer, db.ForeignKey('positions.id'), nullable=False)  
     candidate_id = db.Column(db.Integer, db.ForeignKey('candidates.id'), nullable=False) 
     vote_time = db.Column(db.DateTime, default=datetime.utcnow)
+    receipt_id = db.Column(db.String(32), index=True)
 
     __table_args__ = (
         db.UniqueConstraint('student_id', 'election_id', 'position_id', name='unique_vote'),
+        db.Index('ix_votes_election_id', 'election_id', 'id'),
+    )
+
+class RankedBallot(db.Model):
+    __tablename__ = 'ranked_ballots'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('end_users.student_id'), nullable=False)
+    election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), nullable=False)
+    position_id = db.Column(db.Integer, db.ForeignKey('positions.id'), nullable=False)
+    # Candidate ids in order of preference, packed as little-endian uint32s (see ranked.py).
+    preferences = db.Column(db.LargeBinary, nullable=False)
+    vote_time = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'election_id', 'position_id', name='unique_ranked_ballot'),
+        db.Index('ix_ranked_ballots_position', 'election_id', 'position_id'),
     )
 
 class VotingSession(db.Model):
@@ -123,3 +147,134 @@ class VotingSession(db.Model):
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String(50), nullable=False)
+
+class ReceiptBatch(db.Model):
+    __tablename__ = 'receipt_batches'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    merkle_root = db.Column(db.String(64), nullable=False)
+    prev_hash = db.Column(db.String(64), nullable=False)
+    chain_hash = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('election_id', 'seq', name='unique_receipt_batch_seq'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "election_id": self.election_id,
+            "seq": self.seq,
+            "size": self.size,
+            "merkle_root": self.merkle_root,
+            "prev_hash": self.prev_hash,
+            "chain_hash": self.chain_hash,
+            "created_at": self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+        }
+
+class VoteReceipt(db.Model):
+    __tablename__ = 'vote_receipts'
+    receipt_id = db.Column(db.String(32), primary_key=True)
+    vote_id = db.Column(db.Integer, unique=True, nullable=False)  # no FK: votes is partitioned
+    election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), nullable=False)
+    batch_id = db.Column(db.Integer, db.ForeignKey('receipt_batches.id'), nullable=False, index=True)
+    leaf_index = db.Column(db.Integer, nullable=False)
+    leaf_hash = db.Column(db.String(64), nullable=False)
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    id = db.Column(db.String(32), primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    params = db.Column(db.Text, nullable=False, default='{}')
+    progress = db.Column(db.Text)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('end_users.student_id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "progress": json.loads(self.progress) if self.progress else {},
+            "result": json.loads(self.result) if self.result else None,
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            "started_at": self.started_at.strftime('%Y-%m-%d %H:%M:%S') if self.started_at else None,
+            "finished_at": self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None,
+        }
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    token_type = db.Column(db.String(10), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('end_users.student_id'))
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class FraudAlert(db.Model):
+    __tablename__ = 'fraud_alerts'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    kind = db.Column(db.String(30), nullable=False)
+    election_id = db.Column(db.Integer, nullable=False, index=True)
+    subject = db.Column(db.String(100), nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    window_seconds = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "election_id": self.election_id,
+            "subject": self.subject,
+            "count": self.count,
+            "window_seconds": self.window_seconds,
+            "created_at": self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+        }
+
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_events'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    topic = db.Column(db.String(50), nullable=False)
+    election_id = db.Column(db.Integer, index=True)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "topic": self.topic,
+            "election_id": self.election_id,
+            "payload": json.loads(self.payload or '{}'),
+            "created_at": self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+        }
+
+class OutboxCursor(db.Model):
+    __tablename__ = 'outbox_cursors'
+    name = db.Column(db.String(50), primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_versions'
+    scope = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class MigrationProgress(db.Model):
+    __tablename__ = 'migration_progress'
+    name = db.Column(db.String(100), primary_key=True)
+    last_id = db.Column(db.BigInteger, nullable=False, default=0)
+    rows_done = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,214 @@
+"""Schema changes that don't lock big tables, for use in Alembic revisions.
+
+A column that needs a value on every existing row is added in three steps,
+each safe to run while the app keeps serving:
+
+    def upgrade():
+        online_migrations.add_column('votes', sa.Column('channel', sa.String(20)))
+        online_migrations.backfill('votes', 'channel', "'web'")
+        online_migrations.set_not_null('votes', 'channel', sa.String(20))
+
+``add_column`` always adds the column as nullable, which is a metadata-only
+change on MySQL 8 (``ALGORITHM=INSTANT``) and PostgreSQL. ``backfill`` then
+fills it in short keyset batches on the primary key, each committed on its
+own, and only touches rows that are still NULL, so values written by the
+new code are left alone. It sleeps between batches, halves the batch when
+one takes longer than ``max_batch_seconds``, logs progress, and records the
+last id it reached in ``migration_progress`` so a rerun after a crash or
+Ctrl-C picks up where it stopped. That record is keyed by ``table.column``
+(or ``name=``), and ``add_column`` clears it, so a downgrade and upgrade
+starts over. ``set_not_null`` and ``create_index`` use each database's
+online variant. On MySQL the statements carry an explicit
+``ALGORITHM``/``LOCK`` clause, so the server refuses the change instead of
+quietly falling back to a blocking table copy.
+
+Backfills run outside the migration's transaction: run the revision on its
+own (``flask db upgrade <revision>``), not together with other changes that
+should roll back with it.
+"""
+import hashlib
+import logging
+import time
+from datetime import datetime
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.schema import CreateColumn
+
+from models import MigrationProgress
+
+# Under alembic's logger so ``flask db upgrade`` prints progress at INFO.
+logger = logging.getLogger('alembic.online_migrations')
+
+
+def _dialect():
+    return op.get_bind().dialect.name
+
+
+def _quote(name):
+    return op.get_bind().dialect.identifier_preparer.quote(name)
+
+
+def _column_sql(column):
+    return str(CreateColumn(column).compile(dialect=op.get_bind().dialect))
+
+
+def add_column(table, column):
+    """Add ``column`` as nullable, without a table rewrite."""
+    column.nullable = True
+    if _dialect() == 'mysql':
+        op.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_column_sql(column)}, ALGORITHM=INSTANT")
+    else:
+        op.add_column(table, column)
+    # A fresh column has nothing filled in, so progress left by an interrupted
+    # backfill of an earlier (since dropped) column of that name is stale.
+    progress = MigrationProgress.__table__
+    op.execute(sa.delete(progress).where(progress.c.name == _progress_name(table, column.name)))
+
+
+def _progress_name(table, column):
+    return f'{table}.{column}'
+
+
+def _load_progress(conn, name):
+    progress = MigrationProgress.__table__
+    return conn.execute(
+        sa.select(progress.c.last_id, progress.c.rows_done).where(progress.c.name == name)
+    ).first()
+
+
+def _save_progress(conn, name, last_id, rows):
+    progress = MigrationProgress.__table__
+    values = {"last_id": last_id, "rows_done": rows, "updated_at": datetime.utcnow()}
+    updated = conn.execute(sa.update(progress).where(progress.c.name == name).values(**values))
+    if not updated.rowcount:
+        conn.execute(sa.insert(progress).values(name=name, **values))
+
+
+def backfill(table, column, value, pk='id', batch_size=1000, pause=0.1,
+             max_batch_seconds=1.0, name=None, report_every=10):
+    """Set ``column`` to ``value`` on every row where it is still NULL.
+
+    ``value`` is a SQL expression (a string such as ``"LOWER(email)"`` or a
+    SQLAlchemy expression) evaluated per row. Returns the rows updated.
+    """
+    name = name or _progress_name(table, column)
+    target = sa.table(table, sa.column(pk), sa.column(column))
+    key = target.c[pk]
+    new_value = sa.text(value) if isinstance(value, str) else value
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        saved = _load_progress(conn, name)
+        last_id, rows = saved if saved else (None, 0)
+        if saved:
+            logger.info("Resuming backfill %s after %s=%s (%d rows done)", name, pk, last_id, rows)
+        end = conn.execute(sa.select(sa.func.max(key))).scalar()
+        start = last_id
+        size = batch_size
+        reported = time.monotonic()
+
+        while end is not None:
+            ids = sa.select(key).order_by(key).limit(size)
+            if last_id is not None:
+                ids = ids.where(key > last_id)
+            batch = conn.execute(ids).scalars().all()
+            if not batch:
+                break
+            started = time.monotonic()
+            bounds = [key <= batch[-1], target.c[column].is_(None)]
+            if last_id is not None:
+                bounds.append(key > last_id)
+            rows += conn.execute(sa.update(target).where(*bounds).values({column: new_value})).rowcount
+            took = time.monotonic() - started
+            last_id = batch[-1]
+            _save_progress(conn, name, last_id, rows)
+
+            if took > max_batch_seconds and size > 1:
+                size = max(size // 2, 1)
+            elif took < max_batch_seconds / 4 and size < batch_size:
+                size = min(size * 2, batch_size)
+            if time.monotonic() - reported >= report_every:
+                reported = time.monotonic()
+                done = (last_id - (start or 0)) / max(end - (start or 0), 1)
+                logger.info("Backfill %s: %d rows, %s=%s of ~%s (%.0f%%), batch %d",
+                            name, rows, pk, last_id, end, min(done, 1) * 100, size)
+            time.sleep(pause)
+
+        conn.execute(sa.delete(MigrationProgress.__table__).where(MigrationProgress.__table__.c.name == name))
+    logger.info("Backfill %s finished: %d rows", name, rows)
+    return rows
+
+
+def _constraint_name(*parts):
+    """Join ``parts`` into a name that fits PostgreSQL's 63-byte identifiers."""
+    name = '_'.join(parts)
+    if len(name) <= 63:
+        return name
+    return f"{name[:54]}_{hashlib.sha1(name.encode()).hexdigest()[:8]}"
+
+
+def _existing_column(table, column, existing_type, existing_server_default, existing_comment):
+    """The column's current definition, made NOT NULL.
+
+    MySQL's MODIFY COLUMN replaces the whole definition, so read it from the
+    database (type with charset and collation, default, comment) rather than
+    rebuilding it from ``existing_type``, which would drop everything else.
+    The ``existing_*`` arguments are only used for offline (``--sql``) runs.
+    """
+    if not op.get_context().as_sql:
+        for info in sa.inspect(op.get_bind()).get_columns(table):
+            if info['name'] == column:
+                existing_type = info['type']
+                existing_server_default = sa.text(info['default']) if info.get('default') is not None else None
+                existing_comment = info.get('comment')
+                break
+        else:
+            raise ValueError(f"{table}.{column} does not exist")
+    elif isinstance(existing_server_default, str):
+        existing_server_default = sa.text(existing_server_default)
+    return sa.Column(column, existing_type, nullable=False,
+                     server_default=existing_server_default, comment=existing_comment)
+
+
+def set_not_null(table, column, existing_type, existing_server_default=None, existing_comment=None,
+                 lock_timeout='5s'):
+    """Make a backfilled column NOT NULL with as little locking as each database allows."""
+    dialect = _dialect()
+    if dialect == 'postgresql':
+        # Each step commits on its own: ADD ... NOT VALID holds its exclusive
+        # lock only for an instant, VALIDATE scans the table under a lock
+        # that lets reads and writes through, and the validated CHECK lets
+        # SET NOT NULL skip its own scan. lock_timeout makes a step give up
+        # rather than queue every other query behind it while it waits for
+        # a long-running transaction.
+        check = _constraint_name(table, column, 'not_null')
+        with op.get_context().autocommit_block():
+            op.execute(f"SET lock_timeout = '{lock_timeout}'")
+            op.execute(f"ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(check)} "
+                       f"CHECK ({_quote(column)} IS NOT NULL) NOT VALID")
+            op.execute(f"ALTER TABLE {_quote(table)} VALIDATE CONSTRAINT {_quote(check)}")
+            op.alter_column(table, column, existing_type=existing_type, nullable=False)
+            op.drop_constraint(check, table, type_='check')
+            op.execute("RESET lock_timeout")
+    elif dialect == 'mysql':
+        definition = _existing_column(table, column, existing_type, existing_server_default, existing_comment)
+        op.execute(f"ALTER TABLE {_quote(table)} MODIFY COLUMN {_column_sql(definition)}, "
+                   f"ALGORITHM=INPLACE, LOCK=NONE")
+    else:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(column, existing_type=existing_type, nullable=False)
+
+
+def create_index(index_name, table, columns, unique=False):
+    """Build an index while the table stays writable."""
+    dialect = _dialect()
+    if dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index(index_name, table, columns, unique=unique, postgresql_concurrently=True)
+    elif dialect == 'mysql':
+        cols = ', '.join(_quote(c) for c in columns)
+        op.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX {_quote(index_name)} "
+                   f"ON {_quote(table)} ({cols}) ALGORITHM=INPLACE LOCK=NONE")
+    else:
+        op.create_index(index_name, table, columns, unique=unique)
@@ -0,0 +1,155 @@
+"""Transactional outbox and change feed.
+
+Mutations call ``record(topic, election_id, **payload)`` before their
+commit, so an event exists exactly when the change does. A relay thread in
+each worker hands new events, in id order and in batches, to the consumers
+registered with ``subscribe(name, callback)``. Each consumer has a cursor
+row in ``outbox_cursors``; the relay locks it while delivering a batch and
+only advances it once the callback returns, so delivery is at-least-once
+and resumes where it stopped after a restart. Several workers may run the
+same consumer: the row lock makes them take turns rather than deliver twice.
+
+The built-in ``broker`` consumer republishes every batch on the shared
+cache's ``outbox`` channel (see cache_server.py) when ``CACHE_URL`` is set.
+Out-of-process readers can also page through ``/admin/events?after=<id>``.
+
+Ids are assigned at insert, not at commit, so an event may become visible
+after a later one. The relay leaves events younger than
+``OUTBOX_SETTLE_SECONDS`` alone to let such stragglers land first.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+
+from cache import cache
+from models import db, OutboxEvent, OutboxCursor
+
+CHANNEL = 'outbox'
+
+logger = logging.getLogger(__name__)
+
+CONSUMERS = {}
+
+_thread = None
+_lock = threading.Lock()
+
+
+def record(topic, election_id=None, **payload):
+    """Add an event to the current transaction; the caller commits."""
+    db.session.add(OutboxEvent(topic=topic, election_id=election_id,
+                               payload=json.dumps(payload, default=str)))
+
+
+def subscribe(name, callback, topics=None):
+    """Register ``callback(events)`` to receive event dicts in batches."""
+    CONSUMERS[name] = (callback, set(topics) if topics else None)
+
+
+def events_after(after_id, limit, settle=0, topic=None):
+    query = select(OutboxEvent).where(OutboxEvent.id > after_id)
+    if settle:
+        query = query.where(OutboxEvent.created_at <= datetime.utcnow() - timedelta(seconds=settle))
+    if topic:
+        query = query.where(OutboxEvent.topic == topic)
+    return db.session.execute(query.order_by(OutboxEvent.id).limit(limit)).scalars().all()
+
+
+def _cursor(name):
+    cursor = db.session.execute(
+        select(OutboxCursor).where(OutboxCursor.name == name).with_for_update()
+    ).scalar_one_or_none()
+    if cursor is None:
+        db.session.add(OutboxCursor(name=name, last_event_id=0))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker created it first.
+            db.session.rollback()
+        return _cursor(name)
+    return cursor
+
+
+def relay(name, batch_size, settle):
+    """Deliver the next batch to one consumer. Returns the number of events."""
+    callback, topics = CONSUMERS[name]
+    cursor = _cursor(name)
+    events = events_after(cursor.last_event_id, batch_size, settle)
+    if not events:
+        db.session.rollback()
+        return 0
+    batch = [e.to_dict() for e in events if topics is None or e.topic in topics]
+    try:
+        if batch:
+            callback(batch)
+    except Exception:
+        db.session.rollback()
+        raise
+    cursor.last_event_id = events[-1].id
+    db.session.commit()
+    return len(events)
+
+
+def prune(retention, chunk_size=1000):
+    """Delete events every consumer is past once they are ``retention`` old."""
+    query = select(OutboxEvent.id).where(OutboxEvent.created_at < datetime.utcnow() - retention)
+    lowest = db.session.execute(select(func.min(OutboxCursor.last_event_id))).scalar()
+    if lowest is not None:
+        query = query.where(OutboxEvent.id <= lowest)
+    ids = db.session.execute(query.order_by(OutboxEvent.id).limit(chunk_size)).scalars().all()
+    if ids:
+        db.session.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(ids)))
+        db.session.commit()
+    return len(ids)
+
+
+def _publish_to_broker(events):
+    if not cache.publish(CHANNEL, json.dumps(events)):
+        raise ConnectionError("Shared cache is unavailable")
+
+
+def _run(app):
+    config = app.config
+    retention = timedelta(hours=config['OUTBOX_RETENTION_HOURS'])
+    while True:
+        with app.app_context():
+            for name in list(CONSUMERS):
+                try:
+                    while relay(name, config['OUTBOX_BATCH_SIZE'], config['OUTBOX_SETTLE_SECONDS']) \
+                            >= config['OUTBOX_BATCH_SIZE']:
+                        pass
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Outbox consumer %s failed", name)
+            try:
+                prune(retention)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Outbox pruning failed")
+            finally:
+                db.session.remove()
+        time.sleep(config['OUTBOX_POLL_SECONDS'])
+
+
+def start(app):
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_run, args=(app,), name='outbox-relay', daemon=True)
+        _thread.start()
+
+
+def init_app(app):
+    if app.config['CACHE_URL']:
+        subscribe('broker', _publish_to_broker)
+    if not app.config['OUTBOX_ENABLED']:
+        return
+
+    @app.before_request
+    def _start_outbox_relay():
+        start(app)
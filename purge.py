@@ -0,0 +1,55 @@
+from sqlalchemy import delete, select
+
+from models import (db, Election, Position, Candidate, Vote, VotingSession,
+                    ReceiptBatch, VoteReceipt, FraudAlert, RankedBallot)
+import voted
+import warmup
+
+# Children before parents, so no statement ever waits on a foreign key. The
+# voting sessions go first so no vote can land after the votes are gone.
+PURGE_ORDER = [
+    ('voting_sessions', VotingSession, VotingSession.session_id),
+    ('fraud_alerts', FraudAlert, FraudAlert.id),
+    ('vote_receipts', VoteReceipt, VoteReceipt.receipt_id),
+    ('receipt_batches', ReceiptBatch, ReceiptBatch.id),
+    ('votes', Vote, Vote.id),
+    ('ranked_ballots', RankedBallot, RankedBallot.id),
+    ('candidates', Candidate, Candidate.id),
+    ('positions', Position, Position.id),
+]
+
+
+def _delete_in_chunks(model, key, election_id, chunk_size):
+    while True:
+        ids = db.session.execute(
+            select(key).where(model.election_id == election_id).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            return
+        db.session.execute(delete(model).where(key.in_(ids)))
+        db.session.commit()
+        yield len(ids)
+
+
+def purge_election(election_id, chunk_size=1000, report=None):
+    """Delete an election and everything hanging off it with set-based statements.
+
+    Each chunk is its own transaction so locks are held briefly. ``report`` is
+    called with the running per-table counts after every chunk.
+    """
+    deleted = {table: 0 for table, _, _ in PURGE_ORDER}
+    for table, model, key in PURGE_ORDER:
+        for count in _delete_in_chunks(model, key, election_id, chunk_size):
+            deleted[table] += count
+            if report:
+                report(table=table, deleted=dict(deleted))
+        if model is VotingSession:
+            # Drop the cached voting window too, so every node stops taking votes.
+            warmup.forget_election(election_id)
+
+    db.session.execute(delete(Election).where(Election.id == election_id))
+    db.session.commit()
+    warmup.forget_election(election_id)
+    voted.forget(election_id)
+    deleted['elections'] = 1
+    return deleted
@@ -0,0 +1,115 @@
+"""Ranked-choice ballots and instant-runoff tabulation.
+
+A ranked ballot is stored as its candidate ids packed into little-endian
+uint32s, most preferred first. Tabulation loads every ballot of a position
+once into an (n_ballots, max_rank) NumPy matrix of candidate indexes (-1
+pads short ballots) and runs each round as a handful of vectorized
+operations: mask eliminated candidates, take each ballot's first remaining
+preference, ``bincount``. NumPy is only imported when tabulating.
+"""
+import struct
+
+from sqlalchemy import select
+
+from models import db, Candidate, RankedBallot
+
+
+def pack_preferences(candidate_ids):
+    return struct.pack(f'<{len(candidate_ids)}I', *candidate_ids)
+
+
+def unpack_preferences(data):
+    return list(struct.unpack(f'<{len(data) // 4}I', data))
+
+
+def preference_matrix(ballots, candidate_ids):
+    """Turn packed ballots into a matrix of indexes into ``candidate_ids``.
+
+    ``candidate_ids`` must be sorted. Ids that are not (or no longer)
+    candidates become -1, like the padding, and are skipped when counting.
+    """
+    import numpy as np
+
+    ids = np.asarray(candidate_ids, dtype=np.int64)
+    lengths = np.fromiter((len(b) // 4 for b in ballots), dtype=np.int64, count=len(ballots))
+    flat = np.frombuffer(b''.join(ballots), dtype='<u4').astype(np.int64)
+    if len(ids):
+        pos = np.searchsorted(ids, flat).clip(max=len(ids) - 1)
+        index = np.where(ids[pos] == flat, pos, -1)
+    else:
+        index = np.full(len(flat), -1)
+
+    width = int(lengths.max()) if len(lengths) else 0
+    matrix = np.full((len(ballots), max(width, 1)), -1, dtype=np.int32)
+    rows = np.repeat(np.arange(len(ballots)), lengths)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    matrix[rows, np.arange(len(flat)) - starts] = index
+    return matrix
+
+
+def instant_runoff(matrix, candidate_ids):
+    """Run IRV rounds over a preference matrix.
+
+    Each round, a candidate with more than half of the continuing ballots
+    wins; otherwise the candidate with the fewest votes is eliminated (ties go
+    against the one with fewer first-round votes, then the higher id).
+    """
+    import numpy as np
+
+    k = len(candidate_ids)
+    # Index k stands in for the -1 padding and for exhausted ballots; it is
+    # permanently "eliminated".
+    eliminated = np.zeros(k + 1, dtype=bool)
+    eliminated[k] = True
+    padded = np.where(matrix < 0, k, matrix)
+
+    def first_remaining(rows):
+        active = ~eliminated[rows]
+        picked = rows[np.arange(len(rows)), active.argmax(axis=1)]
+        return np.where(active.any(axis=1), picked, k)
+
+    # Only ballots whose current choice was just eliminated move on, so later
+    # rounds touch a fraction of the matrix.
+    top = first_remaining(padded)
+    rounds, first_round, winner = [], None, None
+
+    while True:
+        counts = np.bincount(top, minlength=k + 1)
+        total = len(matrix) - int(counts[k])
+        counts = counts[:k]
+        if first_round is None:
+            first_round = counts.copy()
+        remaining = np.flatnonzero(~eliminated[:k])
+        round_info = {
+            "round": len(rounds) + 1,
+            "tallies": {str(candidate_ids[i]): int(counts[i]) for i in remaining},
+            "continuing": total,
+            "exhausted": len(matrix) - total,
+            "eliminated": None,
+        }
+        rounds.append(round_info)
+        if total == 0:
+            break
+        leader = remaining[np.argmax(counts[remaining])]
+        if counts[leader] * 2 > total or len(remaining) == 1:
+            winner = candidate_ids[leader]
+            break
+        loser = min(remaining, key=lambda i: (counts[i], first_round[i], -candidate_ids[i]))
+        eliminated[loser] = True
+        round_info["eliminated"] = candidate_ids[loser]
+        moved = np.flatnonzero(top == loser)
+        top[moved] = first_remaining(padded[moved])
+    return {"winner": winner, "rounds": rounds}
+
+
+def tabulate_position(election_id, position_id):
+    candidate_ids = db.session.execute(
+        select(Candidate.id).where(Candidate.position_id == position_id).order_by(Candidate.id)
+    ).scalars().all()
+    ballots = db.session.execute(
+        select(RankedBallot.preferences)
+        .where(RankedBallot.election_id == election_id, RankedBallot.position_id == position_id)
+    ).scalars().all()
+    result = instant_runoff(preference_matrix(ballots, candidate_ids), candidate_ids)
+    result["ballots"] = len(ballots)
+    return result
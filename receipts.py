@@ -0,0 +1,200 @@
+"""Verifiable vote receipts.
+
+``cast_vote`` only stores a random ``receipt_id`` on the vote. A background
+thread per worker later picks up votes without a receipt, groups them per
+election into batches, builds a Merkle tree over each batch and appends the
+root to the election's hash chain:
+
+    chain_hash = sha256(prev_hash || merkle_root)
+
+An inclusion proof is the list of sibling hashes from a leaf to its batch
+root, so checking it takes O(log n) hashes.
+
+Votes are picked up from just below the highest vote id already batched
+(``RECEIPTS_LOOKBACK_IDS`` back, for votes that committed late), with a full
+sweep of ``votes`` when the thread starts and every
+``RECEIPTS_FULL_SCAN_SECONDS`` after that.
+"""
+import hashlib
+import secrets
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from cache import cache
+from models import db, Vote, VoteReceipt, ReceiptBatch
+
+GENESIS_HASH = '0' * 64
+
+_thread = None
+_lock = threading.Lock()
+
+
+def new_receipt_id():
+    return secrets.token_hex(16)
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def leaf_hash(receipt_id, election_id, position_id, candidate_id, vote_time):
+    payload = f"{receipt_id}|{election_id}|{position_id}|{candidate_id}|{vote_time.isoformat()}"
+    return _sha256(b'\x00' + payload.encode())
+
+
+def node_hash(left, right):
+    return _sha256(b'\x01' + bytes.fromhex(left) + bytes.fromhex(right))
+
+
+def merkle_levels(leaves):
+    """All levels of the tree, leaves first. An odd node is carried up as is."""
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def inclusion_proof(levels, index):
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({"side": "left" if sibling < index else "right", "hash": level[sibling]})
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf, proof, root):
+    node = leaf
+    for step in proof:
+        node = node_hash(step["hash"], node) if step["side"] == "left" else node_hash(node, step["hash"])
+    return node == root
+
+
+def _batch_levels(batch_id):
+    def load():
+        leaves = db.session.execute(
+            select(VoteReceipt.leaf_hash)
+            .where(VoteReceipt.batch_id == batch_id)
+            .order_by(VoteReceipt.leaf_index)
+        ).scalars().all()
+        return merkle_levels(leaves)
+    # Batches are immutable, so their trees can stay cached.
+    return cache.get_or_load(f'merkle:{batch_id}', load, ttl=3600)
+
+
+def receipt_proof(receipt_id):
+    """Inclusion proof for a receipt, or None if it has not been batched yet."""
+    receipt = db.session.get(VoteReceipt, receipt_id)
+    if receipt is None:
+        return None
+    batch = db.session.get(ReceiptBatch, receipt.batch_id)
+    levels = _batch_levels(batch.id)
+    return {
+        "receipt_id": receipt.receipt_id,
+        "election_id": receipt.election_id,
+        "leaf_hash": receipt.leaf_hash,
+        "leaf_index": receipt.leaf_index,
+        "proof": inclusion_proof(levels, receipt.leaf_index),
+        "batch": batch.to_dict(),
+    }
+
+
+def _append_batch(election_id, votes):
+    last = (ReceiptBatch.query
+            .filter_by(election_id=election_id)
+            .order_by(ReceiptBatch.seq.desc())
+            .with_for_update()
+            .first())
+    leaves = [leaf_hash(v.receipt_id, v.election_id, v.position_id, v.candidate_id, v.vote_time) for v in votes]
+    root = merkle_levels(leaves)[-1][0]
+    prev_hash = last.chain_hash if last else GENESIS_HASH
+    batch = ReceiptBatch(
+        election_id=election_id,
+        seq=last.seq + 1 if last else 1,
+        size=len(votes),
+        merkle_root=root,
+        prev_hash=prev_hash,
+        chain_hash=_sha256(bytes.fromhex(prev_hash) + bytes.fromhex(root)),
+    )
+    db.session.add(batch)
+    db.session.flush()
+    db.session.add_all(
+        VoteReceipt(receipt_id=v.receipt_id, vote_id=v.id, election_id=election_id,
+                    batch_id=batch.id, leaf_index=i, leaf_hash=leaves[i])
+        for i, v in enumerate(votes)
+    )
+
+
+def high_water():
+    """Highest vote id that has a receipt."""
+    return db.session.execute(select(func.max(VoteReceipt.vote_id))).scalar() or 0
+
+
+def build_batches(batch_size, after_id=0):
+    """Batch votes above ``after_id`` that have a receipt id but no receipt yet."""
+    pending = db.session.execute(
+        select(Vote.id, Vote.receipt_id, Vote.election_id, Vote.position_id, Vote.candidate_id, Vote.vote_time)
+        .outerjoin(VoteReceipt, VoteReceipt.vote_id == Vote.id)
+        .where(Vote.id > after_id, Vote.receipt_id.is_not(None), VoteReceipt.vote_id.is_(None))
+        .order_by(Vote.id)
+        .limit(batch_size)
+    ).all()
+    by_election = defaultdict(list)
+    for vote in pending:
+        by_election[vote.election_id].append(vote)
+
+    for election_id, votes in by_election.items():
+        try:
+            _append_batch(election_id, votes)
+            db.session.commit()
+        except IntegrityError:
+            # Another worker batched these votes (or extended the chain) first.
+            db.session.rollback()
+    return len(pending)
+
+
+def _run(app):
+    config = app.config
+    full_scan_at = 0
+    while True:
+        time.sleep(config['RECEIPTS_BATCH_INTERVAL'])
+        with app.app_context():
+            try:
+                if time.monotonic() >= full_scan_at:
+                    after_id = 0
+                    full_scan_at = time.monotonic() + config['RECEIPTS_FULL_SCAN_SECONDS']
+                else:
+                    after_id = max(high_water() - config['RECEIPTS_LOOKBACK_IDS'], 0)
+                while build_batches(config['RECEIPTS_BATCH_SIZE'], after_id) >= config['RECEIPTS_BATCH_SIZE']:
+                    pass
+            except Exception:
+                app.logger.exception("Receipt batching failed")
+            finally:
+                db.session.remove()
+
+
+def start(app):
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_run, args=(app,), name='receipt-batcher', daemon=True)
+        _thread.start()
+
+
+def init_app(app):
+    if not app.config['RECEIPTS_ENABLED']:
+        return
+
+    @app.before_request
+    def _start_receipts():
+        start(app)
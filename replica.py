@@ -0,0 +1,69 @@
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+
+from cache import cache
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """Sends reads to the ``replica`` bind while a request is marked read-only.
+
+    Flushes (and anything else outside a ``read_replica`` view) still go to the
+    primary, so falling back is just a matter of not configuring the bind.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _use_replica():
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _use_replica():
+    return has_request_context() and g.get('use_replica', False)
+
+
+def _sticky_key(student_id):
+    return f'replica-sticky:{student_id}'
+
+
+def mark_written(student_id):
+    """Pin ``student_id`` to the primary for ``REPLICA_STICKY_SECONDS``.
+
+    The marker lives in the shared cache when there is one, so the user's
+    next request sticks to the primary whichever worker it lands on.
+    """
+    window = current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+    cache.set(_sticky_key(student_id), time.time() + window, ttl=window)
+
+
+def _is_sticky(student_id):
+    until = cache.get(_sticky_key(student_id))
+    return until is not None and until > time.time()
+
+
+def read_replica(fn):
+    """Route the view's queries to the read replica.
+
+    Must sit below ``@jwt_required()`` so the caller is known; users who wrote
+    recently keep reading from the primary so they see their own vote.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.use_replica = not _is_sticky(get_jwt_identity())
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def configure(app):
+    url = app.config.get('DATABASE_REPLICA_URL')
+    if url:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = url
+        app.config['SQLALCHEMY_BINDS'] = binds
@@ -1,8 +1,19 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify, send_from_directory
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Election, Candidate, Voter, Position,EndUser,VotingSession
-from app import role_required
+from models import db, Election, Candidate, Voter, Position,EndUser,VotingSession,Job,FraudAlert,Vote,RankedBallot
+from auth import role_required
+from replica import read_replica
+import http_cache
+import jobs
+import outbox
+import ranked
+import snapshots
+import tasks
+import voted
+import warmup
+from archive import archived_manifest, closed_elections
 from datetime import datetime
+from sqlalchemy import func, select, union
 from zoneinfo import ZoneInfo
 
     
@@ -43,7 +54,8 @@ def _position_to_dict(p):
     return {
         "id": p.id,
         "name": p.name,
-        "election_id": p.election_id
+        "election_id": p.election_id,
+        "ballot_type": p.ballot_type
     }
 
 def _voter_to_dict(v):
@@ -58,6 +70,7 @@ def _voter_to_dict(v):
 @admin_bp.route('/admin/elections', methods=['GET'])
 @jwt_required()
 @role_required('admin')
+@read_replica
 def list_elections():
     elections = Election.query.order_by(Election.start_time.desc()).all()
     return jsonify({"elections": [_election_to_dict(e) for e in elections]}), 200
@@ -65,6 +78,8 @@ def list_elections():
 @admin_bp.route('/admin/elections/<int:election_id>', methods=['GET'])
 @jwt_required()
 @role_required('admin')
+@read_replica
+@http_cache.conditional(lambda election_id: http_cache.vote_scopes(election_id), http_cache.ADMIN)
 def election_details(election_id):
     election = Election.query.get_or_404(election_id)
     positions = Position.query.filter_by(election_id=election_id).all()
@@ -75,6 +90,82 @@ def election_details(election_id):
         "candidates": [_candidate_to_dict(c) for c in candidates]
     }), 200
 
+@admin_bp.route('/admin/elections/<int:election_id>/dashboard', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+@read_replica
+@http_cache.conditional(lambda election_id: http_cache.vote_scopes(election_id) + ['voters'], http_cache.ADMIN)
+def election_dashboard(election_id):
+    # Everything in one statement: one row per candidate, with the session and
+    # turnout figures as scalar subqueries repeated on each row.
+    session = (select(VotingSession)
+               .where(VotingSession.election_id == election_id)
+               .order_by(VotingSession.session_id).limit(1).subquery())
+    # Ranked-only voters count too, as in /turnout.
+    voters = union(select(Vote.student_id).where(Vote.election_id == election_id),
+                   select(RankedBallot.student_id).where(RankedBallot.election_id == election_id)).subquery()
+    voted = select(func.count()).select_from(voters).scalar_subquery()
+    eligible = select(func.count(EndUser.student_id)).scalar_subquery()
+    rows = db.session.execute(
+        select(Election,
+               Position.id.label('position_id'), Position.name.label('position_name'),
+               Candidate.id.label('candidate_id'), Candidate.name.label('candidate_name'),
+               Candidate.votes,
+               session.c.session_id, session.c.status.label('session_status'),
+               session.c.start_time.label('session_start'), session.c.end_time.label('session_end'),
+               voted.label('voted'), eligible.label('eligible'))
+        .outerjoin(Position, Position.election_id == Election.id)
+        .outerjoin(Candidate, Candidate.position_id == Position.id)
+        .outerjoin(session, session.c.election_id == Election.id)
+        .where(Election.id == election_id)
+        .order_by(Position.id, Candidate.votes.desc(), Candidate.id)
+    ).all()
+    if not rows:
+        return jsonify({"message": "Not found"}), 404
+
+    first = rows[0]
+    positions = {}
+    for row in rows:
+        if row.position_id is None:
+            continue
+        position = positions.setdefault(row.position_id, {
+            "id": row.position_id, "name": row.position_name, "total_votes": 0, "candidates": []
+        })
+        if row.candidate_id is not None:
+            position["candidates"].append({"id": row.candidate_id, "name": row.candidate_name,
+                                           "votes": row.votes or 0})
+            position["total_votes"] += row.votes or 0
+
+    session_info = None
+    if first.session_id is not None:
+        session_info = {
+            "id": first.session_id,
+            "status": first.session_status,
+            "start_time": first.session_start.strftime('%Y-%m-%d %H:%M:%S'),
+            "end_time": first.session_end.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+    return jsonify({
+        "election": _election_to_dict(first.Election),
+        "session": session_info,
+        "positions": list(positions.values()),
+        "turnout": {
+            "voted": first.voted,
+            "eligible": first.eligible,
+            "percent": round(100 * first.voted / first.eligible, 1) if first.eligible else 0.0,
+        },
+    }), 200
+
+@admin_bp.route('/admin/elections/<int:election_id>/turnout', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def election_turnout(election_id):
+    Election.query.get_or_404(election_id)
+    counts = voted.turnout(election_id)
+    eligible = db.session.execute(select(func.count(EndUser.student_id))).scalar()
+    counts["eligible"] = eligible
+    counts["percent"] = round(100 * counts["voted"] / eligible, 1) if eligible else 0.0
+    return jsonify({"turnout": counts}), 200
+
 @admin_bp.route('/admin/elections', methods=['POST'])
 @jwt_required()
 @role_required('admin')
@@ -154,7 +245,9 @@ def edit_election(election_id):
             election.end_time = datetime.strptime(data["end_time"], '%Y-%m-%d %H:%M:%S')
         except ValueError:
             return jsonify({"message": "Invalid date format. Use YYYY-MM-DD HH:MM:SS"}), 400
+    outbox.record('election.updated', election_id, election=_election_to_dict(election))
     db.session.commit()
+    warmup.forget_election(election_id)
     return jsonify({"msg": "Election updated", "election": _election_to_dict(election)}), 200
 
 @admin_bp.route('/admin/elections/<int:election_id>', methods=['DELETE'])
@@ -162,17 +255,101 @@ def edit_election(election_id):
 @role_required('admin')
 def delete_election(election_id):
     election = Election.query.get_or_404(election_id)
-    db.session.delete(election)
+    election.status = 'deleting'
     db.session.commit()
-    return jsonify({"msg": "Election deleted"}), 200
+    warmup.forget_election(election_id)
+    job = jobs.enqueue('delete_election', created_by=int(get_jwt_identity()),
+                       election_id=election_id, chunk_size=current_app.config['PURGE_CHUNK_SIZE'])
+    return jsonify({"msg": "Election deletion started", "job": job.to_dict()}), 202
+
+@admin_bp.route('/admin/elections/<int:election_id>/recount', methods=['POST'])
+@jwt_required()
+@role_required('admin')
+def recount_election(election_id):
+    Election.query.get_or_404(election_id)
+    job = jobs.enqueue('recount_election', created_by=int(get_jwt_identity()), election_id=election_id)
+    return jsonify({"msg": "Recount started", "job": job.to_dict()}), 202
+
+@admin_bp.route('/admin/events', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def list_events():
+    after = request.args.get('after', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    events = outbox.events_after(after, limit, current_app.config['OUTBOX_SETTLE_SECONDS'],
+                                 topic=request.args.get('topic'))
+    return jsonify({
+        "events": [e.to_dict() for e in events],
+        "next": events[-1].id if events else after,
+    }), 200
+
+@admin_bp.route('/admin/jobs', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def list_jobs():
+    query = Job.query
+    if request.args.get('status'):
+        query = query.filter_by(status=request.args['status'])
+    recent = query.order_by(Job.created_at.desc()).limit(50).all()
+    return jsonify({"jobs": [j.to_dict() for j in recent]}), 200
+
+@admin_bp.route('/admin/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def job_status(job_id):
+    job = Job.query.get_or_404(job_id)
+    return jsonify({"job": job.to_dict()}), 200
+
+@admin_bp.route('/admin/jobs/<job_id>/cancel', methods=['POST'])
+@jwt_required()
+@role_required('admin')
+def cancel_job(job_id):
+    job = Job.query.get_or_404(job_id)
+    if job.status not in ('queued', 'running'):
+        return jsonify({"message": f"Job is already {job.status}"}), 409
+    jobs.cancel(job)
+    return jsonify({"msg": "Cancellation requested", "job": job.to_dict()}), 202
+
+@admin_bp.route('/admin/jobs/<job_id>/file', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def job_file(job_id):
+    job = Job.query.get_or_404(job_id)
+    result = job.to_dict()["result"] or {}
+    if job.status != 'done' or "file" not in result:
+        return jsonify({"message": "Job has no file to download"}), 404
+    return send_from_directory(current_app.config['EXPORT_DIR'], result["file"], as_attachment=True)
 
 @admin_bp.route('/admin/voters', methods=['GET'])
 @jwt_required()
 @role_required('admin')
+@http_cache.conditional(['voters'], http_cache.ADMIN)
 def list_voters():
     voters = EndUser.query.all()
     return jsonify({"voters": [_voter_to_dict(v) for v in voters]}), 200
 
+@admin_bp.route('/admin/voters/export', methods=['POST'])
+@jwt_required()
+@role_required('admin')
+def export_voters():
+    job = jobs.enqueue('export_voters', created_by=int(get_jwt_identity()))
+    return jsonify({"msg": "Export started", "job": job.to_dict()}), 202
+
+@admin_bp.route('/admin/voters/import', methods=['POST'])
+@jwt_required()
+@role_required('admin')
+def import_voters():
+    data = request.get_json()
+    if not data or not isinstance(data.get("voters"), list):
+        return jsonify({"message": "Missing voters list"}), 400
+    if not all(isinstance(row, dict) for row in data["voters"]):
+        return jsonify({"message": "Each voter must be an object"}), 400
+    # The list holds plaintext passwords, so it goes to a private file the task
+    # deletes rather than into the jobs table; hashing is left to the task.
+    filename = tasks.stash_import(data["voters"])
+    job = jobs.enqueue('import_voters', created_by=int(get_jwt_identity()), filename=filename)
+    return jsonify({"msg": "Import started", "job": job.to_dict()}), 202
+
 @admin_bp.route('/admin/elections/<int:election_id>/positions', methods=['POST'])
 @jwt_required()
 @role_required('admin')
@@ -180,9 +357,15 @@ def add_position(election_id):
     data = request.get_json()
     if not data or "name" not in data:
         return jsonify({"message": "Missing position name"}), 400
-    position = Position(name=data['name'], election_id=election_id)
+    ballot_type = data.get('ballot_type', 'plurality')
+    if ballot_type not in ('plurality', 'ranked'):
+        return jsonify({"message": "ballot_type must be plurality or ranked"}), 400
+    position = Position(name=data['name'], election_id=election_id, ballot_type=ballot_type)
     db.session.add(position)
+    db.session.flush()
+    outbox.record('position.added', election_id, position=_position_to_dict(position))
     db.session.commit()
+    warmup.forget_election(election_id)
     return jsonify({"msg": "Position added", "position": _position_to_dict(position)}), 201
 
 @admin_bp.route('/admin/elections/<int:election_id>/candidates', methods=['POST'])
@@ -198,25 +381,65 @@ def add_candidate(election_id):
         position_id=data['position_id']
     )
     db.session.add(candidate)
+    db.session.flush()
+    outbox.record('candidate.added', election_id, candidate=_candidate_to_dict(candidate))
     db.session.commit()
+    warmup.forget_election(election_id)
     return jsonify({"msg": "Candidate added", "candidate": _candidate_to_dict(candidate)}), 201
 
 @admin_bp.route('/admin/elections/<int:election_id>/results', methods=['GET'])
 @jwt_required()
 @role_required('admin')
+@http_cache.conditional(lambda election_id: http_cache.vote_scopes(election_id), http_cache.ADMIN)
 def election_results(election_id):
-    positions = Position.query.filter_by(election_id=election_id).all()
+    if warmup.results_final(election_id):
+        return snapshots.send(election_id, 'by-position')
+    return jsonify(snapshots.results_by_position(election_id)), 200
+
+@admin_bp.route('/admin/elections/<int:election_id>/results/ranked', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+@read_replica
+@http_cache.conditional(lambda election_id: http_cache.vote_scopes(election_id), http_cache.ADMIN)
+def ranked_results(election_id):
+    positions = Position.query.filter_by(election_id=election_id, ballot_type='ranked').all()
     results = []
     for pos in positions:
-        candidates = Candidate.query.filter_by(position_id=pos.id).all()
-        results.append({
-            "position": pos.name,
-            "candidates": [
-                {"name": c.name, "votes": c.votes} for c in candidates
-            ]
-        })
+        result = ranked.tabulate_position(election_id, pos.id)
+        results.append({"position": pos.name, "position_id": pos.id, **result})
     return jsonify({"results": results}), 200
 
+@admin_bp.route('/admin/elections/<int:election_id>/archive', methods=['POST'])
+@jwt_required()
+@role_required('admin')
+def archive_election_votes(election_id):
+    election = Election.query.get_or_404(election_id)
+    if election not in closed_elections():
+        return jsonify({"message": "Only closed elections can be archived"}), 400
+    job = jobs.enqueue('archive_election', created_by=int(get_jwt_identity()), election_id=election_id)
+    return jsonify({"msg": "Archiving started", "job": job.to_dict()}), 202
+
+@admin_bp.route('/admin/elections/<int:election_id>/archive', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def archived_election(election_id):
+    manifest = archived_manifest(election_id)
+    if manifest is None:
+        return jsonify({"message": "Election has not been archived"}), 404
+    return jsonify({"archive": manifest}), 200
+
+@admin_bp.route('/admin/alerts', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def list_alerts():
+    query = FraudAlert.query
+    if request.args.get('election_id'):
+        query = query.filter_by(election_id=request.args['election_id'])
+    if request.args.get('kind'):
+        query = query.filter_by(kind=request.args['kind'])
+    alerts = query.order_by(FraudAlert.id.desc()).limit(100).all()
+    return jsonify({"alerts": [a.to_dict() for a in alerts]}), 200
+
 @admin_bp.route('/admin/candidates/<int:candidate_id>', methods=['GET'])
 @jwt_required()
 def candidate_profile(candidate_id):
@@ -275,6 +498,7 @@ def create_voting_session():
     )
     db.session.add(session)
     db.session.commit()
+    warmup.forget_election(session.election_id)
 
     return jsonify({
         "message": "Voting session created successfully",
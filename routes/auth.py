@@ -0,0 +1,110 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import (create_access_token, create_refresh_token, decode_token,
+                                get_jwt, get_jwt_identity, jwt_required)
+from jwt.exceptions import PyJWTError
+from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import timedelta
+from models import db, EndUser
+from auth import role_required, forget_user_role, revocations
+import http_cache
+
+auth_bp = Blueprint('auth', __name__)
+
+@auth_bp.route('/register', methods=['POST'])
+def register():
+    data = request.get_json()
+    if not data or not all(k in data for k in ("name", "email", "password","school_id")):
+        return jsonify({"message": "Missing data"}), 400
+
+    if EndUser.query.filter_by(email=data['email']).first():
+        return jsonify({"message": "Email already registered"}), 409
+    
+    if EndUser.query.filter_by(school_id=data['school_id']).first():
+        return jsonify({"message": "School ID already registered"}), 409
+    
+    if not data['email'].endswith("@usiu.ac.ke"):
+        return jsonify({"message": "Use your institutional email"}), 400
+
+
+    hashed_password = generate_password_hash(data['password'])
+    user = EndUser(
+        name=data['name'],
+        email=data['email'],
+        school_id=data['school_id'],
+        password_hash=hashed_password,
+        role='voter'
+    )
+    db.session.add(user)
+    db.session.commit()
+    http_cache.voters_changed()
+    return jsonify({"message": "User registered successfully"}), 201
+
+@auth_bp.route('/login', methods=['POST'])
+def login():
+    data = request.get_json()
+    if not data or not all(k in data for k in ("email", "password")):
+        return jsonify({"message": "Missing data"}), 400
+
+    user = EndUser.query.filter_by(email=data['email']).first()
+    if user and check_password_hash(user.password_hash, data['password']):
+        access_token = create_access_token(identity=str(user.student_id), expires_delta=timedelta(hours=1))
+        refresh_token = create_refresh_token(identity=str(user.student_id))
+        return jsonify({"access_token": access_token, "refresh_token": refresh_token,
+                        "student_id": user.student_id, "role": user.role}), 200
+    return jsonify({"message": "Invalid credentials"}), 401
+
+@auth_bp.route('/admin/login', methods=['POST', 'OPTIONS'])
+def admin_login():
+    if request.method == 'OPTIONS':
+        # Handle CORS preflight
+        return jsonify({}), 200
+    data = request.get_json()
+    if not data or not all(k in data for k in ("email", "password")):
+        return jsonify({"message": "Missing data"}), 400
+
+    user = EndUser.query.filter_by(email=data['email'], role='admin').first()
+    if user and check_password_hash(user.password_hash, data['password']):
+        access_token = create_access_token(identity=str(user.student_id), expires_delta=timedelta(hours=1))
+        refresh_token = create_refresh_token(identity=str(user.student_id))
+        return jsonify({"access_token": access_token, "refresh_token": refresh_token,
+                        "student_id": user.student_id, "role": user.role}), 200
+    return jsonify({"message": "Invalid credentials or not an admin"}), 401
+
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    access_token = create_access_token(identity=get_jwt_identity(), expires_delta=timedelta(hours=1))
+    return jsonify({"access_token": access_token}), 200
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    revocations.revoke(get_jwt())
+    data = request.get_json(silent=True) or {}
+    if data.get("refresh_token"):
+        try:
+            claims = decode_token(data["refresh_token"])
+        except PyJWTError:
+            return jsonify({"message": "Invalid refresh token"}), 400
+        if claims["sub"] != get_jwt_identity():
+            return jsonify({"message": "Invalid refresh token"}), 400
+        revocations.revoke(claims)
+    return jsonify({"message": "Logged out"}), 200
+
+@auth_bp.route('/promote_user', methods=["POST"])
+@jwt_required()
+@role_required('admin')
+def promote_user():
+    data = request.get_json()
+    if not data or not all(k in data for k in ("email", "role")):
+        return jsonify({"message": "Missing data"}), 400
+
+    user = EndUser.query.filter_by(email=data['email']).first()
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+
+    user.role = data['role']
+    db.session.commit()
+    forget_user_role(user.student_id)
+    http_cache.voters_changed()
+    return jsonify({"message": f"{user.email} promoted to {user.role}"}), 200
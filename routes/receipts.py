@@ -0,0 +1,24 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required
+from models import Vote, ReceiptBatch
+from replica import read_replica
+import receipts
+
+receipts_bp = Blueprint('receipts', __name__)
+
+@receipts_bp.route('/receipts/<receipt_id>', methods=['GET'])
+@jwt_required()
+def receipt_proof(receipt_id):
+    proof = receipts.receipt_proof(receipt_id)
+    if proof:
+        return jsonify(proof), 200
+    if Vote.query.filter_by(receipt_id=receipt_id).first():
+        return jsonify({"receipt_id": receipt_id, "status": "pending"}), 202
+    return jsonify({"message": "Receipt not found"}), 404
+
+@receipts_bp.route('/elections/<int:election_id>/receipt-batches', methods=['GET'])
+@jwt_required()
+@read_replica
+def receipt_batches(election_id):
+    batches = ReceiptBatch.query.filter_by(election_id=election_id).order_by(ReceiptBatch.seq).all()
+    return jsonify({"batches": [b.to_dict() for b in batches]}), 200
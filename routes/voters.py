@@ -1,21 +1,280 @@
-from flask import Blueprint, jsonify
-from flask_jwt_extended import jwt_required
-from models import Election, Position
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import db, Election, Candidate, RankedBallot, Vote, VotingSession
 from datetime import datetime
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from zoneinfo import ZoneInfo
+import candidate_search
+import fraud
+import http_cache
+import outbox
+import ranked
+import receipts
+import snapshots
+import voted
+import replica
+import warmup
+from replica import read_replica
 
 voter_bp = Blueprint('voter', __name__)
 
+MAX_PER_PAGE = 100
+ORDER_COLUMNS = {
+    'id': Candidate.id,
+    'name': func.lower(Candidate.name),
+    '-name': func.lower(Candidate.name).desc(),
+    'votes': Candidate.votes,
+    '-votes': Candidate.votes.desc(),
+}
+
+def _results_final(election_id):
+    return bool(election_id and election_id.isdigit() and warmup.results_final(int(election_id)))
+
+def _results_cache_control(election_id):
+    return http_cache.CLOSED_RESULTS if _results_final(election_id) else http_cache.LIVE_RESULTS
+
+def _results_scopes(election_id):
+    return http_cache.vote_scopes(election_id, final=_results_final(election_id))
+
 @voter_bp.route('/positions', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_positions():
     now = datetime.utcnow()
     active_election = Election.query.filter(Election.start_time <= now, Election.end_time >= now).first()
     if not active_election:
         return jsonify([]), 200
 
-    positions = Position.query.filter_by(election_id=active_election.id).all()
-    return jsonify([{
-        "id": p.id,
-        "name": p.name,
-        "election_id": p.election_id
-    } for p in positions]), 200
\ No newline at end of file
+    ballot = warmup.ballot(active_election.id)
+    return jsonify(ballot["positions"] if ballot else []), 200
+
+@voter_bp.route('/candidates', methods=['GET'])
+@jwt_required()
+@read_replica
+@http_cache.conditional(lambda: _results_scopes(request.args.get('election_id')),
+                        http_cache.BALLOT)
+def list_candidates():
+    election_id = request.args.get('election_id')
+    position_id = request.args.get('position_id')
+    search = request.args.get('q', '').strip()
+    order = request.args.get('order', 'id')
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', type=int)
+    if order not in candidate_search.ORDERINGS:
+        return jsonify({"message": "Invalid order"}), 400
+    if page < 1 or (per_page is not None and not 1 <= per_page <= MAX_PER_PAGE):
+        return jsonify({"message": "Invalid page or per_page"}), 400
+
+    if election_id and election_id.isdigit():
+        ballot = warmup.ballot(int(election_id))
+        output = []
+        if ballot:
+            index = candidate_search.index_for(int(election_id), ballot)
+            # Votes don't reload the cached ballot, so its tallies are read live.
+            votes = dict(db.session.execute(
+                select(Candidate.id, Candidate.votes).where(Candidate.election_id == int(election_id))
+            ).all())
+            output = candidate_search.search(index, search, position_id, order, votes)
+        total = len(output)
+        if per_page:
+            output = output[(page - 1) * per_page:page * per_page]
+    else:
+        query = Candidate.query
+        if election_id:
+            query = query.filter_by(election_id=election_id)
+        if position_id:
+            query = query.filter_by(position_id=position_id)
+        if search:
+            # Same matching as the in-memory index: word prefixes, else a substring.
+            prefix, contains = candidate_search.name_clauses(Candidate.name, search)
+            total = query.filter(prefix).count()
+            if total:
+                query = query.filter(prefix)
+            else:
+                query = query.filter(contains)
+                total = query.count()
+        else:
+            total = query.count()
+        query = query.order_by(ORDER_COLUMNS[order], Candidate.id)
+        if per_page:
+            query = query.limit(per_page).offset((page - 1) * per_page)
+        output = [c.to_dict() for c in query.all()]
+
+    response = jsonify(output)
+    response.headers['X-Total-Count'] = str(total)
+    return response, 200
+
+def _voting_closed(election_id):
+    """Error response if voting is not open for the election, else None."""
+    nairobi = ZoneInfo("Africa/Nairobi")
+    now = datetime.now(nairobi)
+
+    session = warmup.session_window(election_id)
+
+    if not session:
+        return jsonify({"message": "No session found for this election"}), 403
+
+    # A deleted election's votes are being purged; new ones would block the purge.
+    ballot = warmup.ballot(election_id)
+    if ballot is None or ballot["election"]["status"] == 'deleting':
+        return jsonify({"message": "Voting is not open for this election"}), 403
+
+    if session['status'] == 'scheduled' and session['start_time'] <= now <= session['end_time']:
+        VotingSession.query.filter_by(session_id=session['session_id']).update({"status": "open"})
+        db.session.commit()
+        session = dict(session, status='open')
+        warmup.remember_session_window(election_id, session)
+
+    if session['status'] != 'open' or not (session['start_time'] <= now <= session['end_time']):
+        return jsonify({"message": "Voting is not open for this election"}), 403
+    return None
+
+def _ballot_type(election_id, position_id):
+    ballot = warmup.ballot(election_id)
+    for position in (ballot["positions"] if ballot else []):
+        if str(position["id"]) == str(position_id):
+            return position.get("ballot_type", "plurality")
+    return None
+
+def _on_ballot(election_id, position_id, candidate_id):
+    ballot = warmup.ballot(election_id)
+    return any(str(c["id"]) == str(candidate_id) and str(c["position_id"]) == str(position_id)
+               for c in (ballot["candidates"] if ballot else []))
+
+def _duplicate(data, student_id):
+    # Repeat ballots are what the rapid_ballots check looks for.
+    fraud.record_vote(student_id, data['election_id'], data['position_id'], data.get('candidate_id'),
+                      request.remote_addr, accepted=False)
+    return jsonify({"message": "You have already voted for this position"}), 400
+
+def _violates(error, constraint):
+    """Whether an IntegrityError came from the named unique constraint."""
+    message = str(error.orig)
+    # SQLite names the columns rather than the constraint.
+    return constraint in message or message.startswith('UNIQUE constraint failed')
+
+@voter_bp.route('/vote', methods=['POST'])
+@jwt_required()
+def cast_vote():
+    data = request.get_json()
+    required = ("election_id", "position_id", "candidate_id")
+    if not data or not all(k in data for k in required):
+        return jsonify({"message": "Missing data"}), 400
+
+    student_id = get_jwt_identity()
+
+    closed = _voting_closed(data['election_id'])
+    if closed:
+        return closed
+    ballot_type = _ballot_type(data['election_id'], data['position_id'])
+    if ballot_type is None:
+        return jsonify({"message": "Invalid position for this election"}), 400
+    if ballot_type == 'ranked':
+        return jsonify({"message": "This position takes ranked ballots, use /vote/ranked"}), 400
+    if not _on_ballot(data['election_id'], data['position_id'], data['candidate_id']):
+        return jsonify({"message": "Invalid candidate for this position"}), 400
+    if voted.has_voted(data['election_id'], data['position_id'], student_id):
+        return _duplicate(data, student_id)
+
+    vote = Vote(
+        student_id=student_id,
+        election_id=data['election_id'],
+        position_id=data['position_id'],
+        candidate_id=data['candidate_id'],
+        receipt_id=receipts.new_receipt_id(),
+        # Whole seconds, so the time hashed into the receipt is exactly the
+        # one MySQL stores and the one the voter gets back.
+        vote_time=datetime.utcnow().replace(microsecond=0)
+    )
+    db.session.add(vote)
+    # Both checks happen in the database: the unique_vote constraint rejects a
+    # second ballot for the position, and the tally is incremented in place.
+    try:
+        db.session.flush()
+        db.session.execute(
+            update(Candidate).where(Candidate.id == data['candidate_id']).values(votes=Candidate.votes + 1)
+        )
+        # Never the receipt id: the voter holds it, so publishing it next to the
+        # candidate would let anyone reading the feed tie a receipt to a choice.
+        outbox.record('vote.cast', data['election_id'], position_id=data['position_id'],
+                      candidate_id=data['candidate_id'])
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if not _violates(e, 'unique_vote'):
+            return jsonify({"message": "Invalid ballot"}), 400
+        voted.mark(data['election_id'], data['position_id'], student_id)
+        return _duplicate(data, student_id)
+    voted.mark(data['election_id'], data['position_id'], student_id)
+    replica.mark_written(student_id)
+    fraud.record_vote(student_id, data['election_id'], data['position_id'], data['candidate_id'],
+                      request.remote_addr)
+    return jsonify({
+        "message": "Vote cast successfully",
+        "receipt_id": vote.receipt_id,
+        "vote_time": vote.vote_time.isoformat(),
+    }), 201
+
+@voter_bp.route('/vote/ranked', methods=['POST'])
+@jwt_required()
+def cast_ranked_vote():
+    data = request.get_json()
+    required = ("election_id", "position_id", "rankings")
+    if not data or not all(k in data for k in required):
+        return jsonify({"message": "Missing data"}), 400
+
+    student_id = get_jwt_identity()
+
+    closed = _voting_closed(data['election_id'])
+    if closed:
+        return closed
+    if _ballot_type(data['election_id'], data['position_id']) != 'ranked':
+        return jsonify({"message": "This position does not take ranked ballots"}), 400
+    if voted.has_voted(data['election_id'], data['position_id'], student_id):
+        return _duplicate(data, student_id)
+
+    rankings = data['rankings']
+    ballot = warmup.ballot(data['election_id'])
+    allowed = {c["id"] for c in ballot["candidates"] if str(c["position_id"]) == str(data['position_id'])}
+    if (not isinstance(rankings, list) or not rankings or len(set(rankings)) != len(rankings)
+            or not all(isinstance(c, int) and c in allowed for c in rankings)):
+        return jsonify({"message": "Rankings must be distinct candidates for this position"}), 400
+
+    db.session.add(RankedBallot(
+        student_id=student_id,
+        election_id=data['election_id'],
+        position_id=data['position_id'],
+        preferences=ranked.pack_preferences(rankings)
+    ))
+    outbox.record('vote.ranked', data['election_id'], position_id=data['position_id'])
+    try:
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if not _violates(e, 'unique_ranked_ballot'):
+            return jsonify({"message": "Invalid ballot"}), 400
+        voted.mark(data['election_id'], data['position_id'], student_id)
+        return _duplicate(data, student_id)
+    voted.mark(data['election_id'], data['position_id'], student_id)
+
+    replica.mark_written(student_id)
+    fraud.record_vote(student_id, data['election_id'], data['position_id'], rankings[0],
+                      request.remote_addr)
+    return jsonify({"message": "Vote cast successfully"}), 201
+
+@voter_bp.route('/results', methods=['GET'])
+@jwt_required()
+@read_replica
+@http_cache.conditional(lambda: _results_scopes(request.args.get('election_id')),
+                        lambda: _results_cache_control(request.args.get('election_id')))
+def results():
+    election_id = request.args.get('election_id')
+    position_id = request.args.get('position_id')
+    if election_id and election_id.isdigit() and warmup.results_final(int(election_id)):
+        if not position_id:
+            return snapshots.send(int(election_id), 'results')
+        snapshots.ensure(int(election_id))
+        rows = snapshots.load(int(election_id), 'results')
+        return jsonify([r for r in rows if str(r["position_id"]) == position_id]), 200
+    return jsonify(snapshots.public_results(election_id, position_id)), 200
@@ -0,0 +1,4 @@
+from app import create_app
+
+# Entry point for web workers, e.g. ``gunicorn serve:app``.
+app = create_app(with_migrations=False)
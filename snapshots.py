@@ -0,0 +1,142 @@
+"""Results snapshots for elections whose voting has ended.
+
+The first results request after an election's voting window (plus
+``SNAPSHOT_GRACE_SECONDS`` for ballots still being committed) writes the
+results to ``SNAPSHOT_DIR`` as JSON and gzipped JSON. From then on both
+results endpoints send the file as is, without touching the database.
+
+File names carry the election's stored version number (see http_cache.py).
+Only an admin change to the election moves it, through
+``warmup.forget_election``, so each node's next request after that writes
+and serves a fresh snapshot even if the old file is still on its disk. A
+cache entry expiring just reads the same number back and finds the same
+file. ``discard`` only tidies up the local files.
+"""
+import glob
+import gzip
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, send_file
+
+import http_cache
+from models import Candidate, Position
+
+KINDS = ('results', 'by-position')
+
+_lock = threading.Lock()
+
+
+def public_results(election_id=None, position_id=None):
+    query = Candidate.query
+    if election_id:
+        query = query.filter_by(election_id=election_id)
+    if position_id:
+        query = query.filter_by(position_id=position_id)
+    candidates = query.order_by(Candidate.votes.desc()).all()
+    return [{
+        "candidate_id": c.id,
+        "name": c.name,
+        "election_id": c.election_id,
+        "position_id": c.position_id,
+        "votes": c.votes
+    } for c in candidates]
+
+
+def results_by_position(election_id):
+    positions = Position.query.filter_by(election_id=election_id).all()
+    results = []
+    for pos in positions:
+        candidates = Candidate.query.filter_by(position_id=pos.id).all()
+        results.append({
+            "position": pos.name,
+            "candidates": [
+                {"name": c.name, "votes": c.votes} for c in candidates
+            ]
+        })
+    return {"results": results}
+
+
+def _version(election_id):
+    return int(http_cache.version(f'election:{election_id}'))
+
+
+def snapshot_path(election_id, kind, version=None):
+    if version is None:
+        version = _version(election_id)
+    return os.path.join(current_app.config['SNAPSHOT_DIR'], f'election-{election_id}-v{version}-{kind}.json')
+
+
+def _file_version(path):
+    match = re.match(r'election-\d+-v(\d+)-', os.path.basename(path))
+    return int(match.group(1)) if match else -1
+
+
+def _files(election_id):
+    return glob.glob(os.path.join(current_app.config['SNAPSHOT_DIR'], f'election-{election_id}-v*.json*'))
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def write_snapshot(election_id):
+    if has_request_context():
+        # A snapshot is final, so never build it from a lagging replica.
+        g.use_replica = False
+    os.makedirs(current_app.config['SNAPSHOT_DIR'], exist_ok=True)
+    version = _version(election_id)
+    for kind, results in (('results', public_results(election_id)),
+                          ('by-position', results_by_position(election_id))):
+        path = snapshot_path(election_id, kind, version)
+        data = json.dumps(results).encode()
+        # The .gz goes first so a present .json always has its .gz next to it.
+        _write_atomic(path + '.gz', gzip.compress(data, mtime=0))
+        _write_atomic(path, data)
+    # Older versions may still be in the middle of being sent, so give them a minute.
+    _remove(f for f in _files(election_id)
+            if _file_version(f) < version and os.path.getmtime(f) < time.time() - 60)
+
+
+def _remove(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def discard(election_id):
+    _remove(_files(election_id))
+
+
+def load(election_id, kind):
+    with open(snapshot_path(election_id, kind)) as f:
+        return json.load(f)
+
+
+def ensure(election_id):
+    if not os.path.exists(snapshot_path(election_id, KINDS[-1])):
+        with _lock:
+            if not os.path.exists(snapshot_path(election_id, KINDS[-1])):
+                write_snapshot(election_id)
+
+
+def send(election_id, kind):
+    """Send an election's snapshot, writing it first if needed."""
+    ensure(election_id)
+    path = snapshot_path(election_id, kind)
+    gzipped = request.accept_encodings['gzip'] > 0
+    response = send_file(path + '.gz' if gzipped else path, mimetype='application/json',
+                         conditional=False, etag=False, max_age=None)
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
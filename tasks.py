@@ -0,0 +1,146 @@
+"""Tasks run by the background job runner (see jobs.py)."""
+import csv
+import json
+import os
+import uuid
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, select, update
+from werkzeug.security import generate_password_hash
+
+from jobs import task
+from models import db, Candidate, Election, EndUser, Vote
+import archive
+import http_cache
+import purge
+import warmup
+
+
+@task('delete_election')
+def delete_election(election_id, chunk_size, report):
+    return purge.purge_election(election_id, chunk_size=chunk_size, report=report)
+
+
+@task('archive_election')
+def archive_election(election_id, report):
+    return archive.archive_election(election_id, report=report)
+
+
+@task('recount_election')
+def recount_election(election_id, report):
+    """Rebuild ``Candidate.votes`` from the votes table in one statement."""
+    election = db.session.get(Election, election_id)
+    if election is None:
+        raise ValueError(f"Election {election_id} not found")
+    if election.status in ('archiving', 'archived'):
+        raise ValueError("Archived elections have no ballots left to recount")
+    counted = select(func.count(Vote.id)).where(Vote.candidate_id == Candidate.id).scalar_subquery()
+    db.session.execute(
+        update(Candidate).where(Candidate.election_id == election_id).values(votes=counted)
+    )
+    db.session.commit()
+    warmup.forget_election(election_id)
+    rows = db.session.execute(
+        select(Candidate.id, Candidate.votes).where(Candidate.election_id == election_id)
+    ).all()
+    return {"candidates": {str(cid): votes for cid, votes in rows}}
+
+
+@task('export_voters')
+def export_voters(report, batch_size=1000):
+    os.makedirs(current_app.config['EXPORT_DIR'], exist_ok=True)
+    filename = f"voters-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.csv"
+    path = os.path.join(current_app.config['EXPORT_DIR'], filename)
+    written = 0
+    last_id = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['student_id', 'name', 'email', 'school_id', 'role', 'is_active', 'created_at'])
+        while True:
+            users = (EndUser.query.filter(EndUser.student_id > last_id)
+                     .order_by(EndUser.student_id).limit(batch_size).all())
+            if not users:
+                break
+            writer.writerows(
+                [u.student_id, u.name, u.email, u.school_id, u.role, u.is_active,
+                 u.created_at.strftime('%Y-%m-%d %H:%M:%S') if u.created_at else '']
+                for u in users
+            )
+            written += len(users)
+            last_id = users[-1].student_id
+            db.session.expunge_all()
+            report(rows=written)
+    return {"file": filename, "rows": written}
+
+
+def stash_import(voters):
+    """Write an import's rows to a file only the app's user can read; returns its name.
+
+    ``IMPORT_DIR`` must be shared with the job runners, like ``EXPORT_DIR``.
+    """
+    os.makedirs(current_app.config['IMPORT_DIR'], exist_ok=True)
+    filename = f"voters-{uuid.uuid4().hex}.json"
+    fd = os.open(os.path.join(current_app.config['IMPORT_DIR'], filename),
+                 os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(voters, f)
+    return filename
+
+
+@task('import_voters')
+def import_voters(filename, report, batch_size=200):
+    """Register voters in bulk with the same rules as /register.
+
+    The rows are read from the file written by ``stash_import``, which is
+    deleted once the import has finished, failed or been cancelled. If the
+    runner dies first the file stays, so the re-queued job can run again.
+    """
+    path = os.path.join(current_app.config['IMPORT_DIR'], os.path.basename(filename))
+    try:
+        with open(path) as f:
+            voters = json.load(f)
+    except FileNotFoundError:
+        raise ValueError("The voter list is gone; submit the import again")
+    try:
+        return _import_voters(voters, report, batch_size)
+    finally:
+        os.remove(path)
+
+
+def _import_voters(voters, report, batch_size):
+    created, skipped = 0, []
+    for start in range(0, len(voters), batch_size):
+        chunk = voters[start:start + batch_size]
+        emails = {v.get('email') for v in chunk}
+        school_ids = {v.get('school_id') for v in chunk}
+        taken = set(db.session.execute(
+            select(EndUser.email, EndUser.school_id)
+            .where((EndUser.email.in_(emails)) | (EndUser.school_id.in_(school_ids)))
+        ).all())
+        taken_emails = {e for e, _ in taken}
+        taken_school_ids = {s for _, s in taken}
+        for row in chunk:
+            if not all(row.get(k) for k in ("name", "email", "password", "school_id")):
+                skipped.append({"email": row.get('email'), "reason": "Missing data"})
+            elif not row['email'].endswith("@usiu.ac.ke"):
+                skipped.append({"email": row['email'], "reason": "Use your institutional email"})
+            elif row['email'] in taken_emails:
+                skipped.append({"email": row['email'], "reason": "Email already registered"})
+            elif row['school_id'] in taken_school_ids:
+                skipped.append({"email": row['email'], "reason": "School ID already registered"})
+            else:
+                db.session.add(EndUser(
+                    name=row['name'],
+                    email=row['email'],
+                    school_id=row['school_id'],
+                    password_hash=generate_password_hash(row['password']),
+                    role='voter'
+                ))
+                taken_emails.add(row['email'])
+                taken_school_ids.add(row['school_id'])
+                created += 1
+        db.session.commit()
+        http_cache.voters_changed()
+        report(processed=start + len(chunk), total=len(voters), created=created)
+    return {"created": created, "skipped": skipped}
@@ -0,0 +1,40 @@
+from ranked import instant_runoff, pack_preferences, preference_matrix
+
+
+def tabulate(ballots, candidate_ids):
+    matrix = preference_matrix([pack_preferences(b) for b in ballots], candidate_ids)
+    return instant_runoff(matrix, candidate_ids)
+
+
+def test_first_round_majority_wins():
+    result = tabulate([[1], [1], [1, 2], [2], [3, 2]], [1, 2, 3])
+    assert result["winner"] == 1
+    assert len(result["rounds"]) == 1
+    assert result["rounds"][0]["tallies"] == {"1": 3, "2": 1, "3": 1}
+
+
+def test_eliminated_ballots_move_to_next_preference():
+    result = tabulate([[1]] * 4 + [[2, 1]] * 2 + [[3, 2]] * 3, [1, 2, 3])
+    assert result["rounds"][0]["eliminated"] == 2
+    assert result["rounds"][1]["tallies"] == {"1": 6, "3": 3}
+    assert result["winner"] == 1
+
+
+def test_exhausted_ballots_leave_the_count_and_ties_eliminate_the_higher_id():
+    result = tabulate([[1]] * 3 + [[2]] * 2 + [[3]] * 2, [1, 2, 3])
+    assert result["rounds"][0]["eliminated"] == 3
+    assert result["rounds"][1]["continuing"] == 5
+    assert result["rounds"][1]["exhausted"] == 2
+    assert result["winner"] == 1
+
+
+def test_unknown_candidates_are_skipped():
+    result = tabulate([[99, 2], [2], [1]], [1, 2])
+    assert result["rounds"][0]["tallies"] == {"1": 1, "2": 2}
+    assert result["winner"] == 2
+
+
+def test_no_ballots_has_no_winner():
+    result = tabulate([], [1, 2])
+    assert result["winner"] is None
+    assert result["rounds"][0]["continuing"] == 0
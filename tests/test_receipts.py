@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from receipts import inclusion_proof, leaf_hash, merkle_levels, verify_proof
+
+
+def leaves(n):
+    return [leaf_hash(f'{i:032x}', 1, 2, 3, datetime(2026, 1, 1, 12, 0, i)) for i in range(n)]
+
+
+def test_every_leaf_has_a_valid_proof():
+    for n in range(1, 10):
+        hashes = leaves(n)
+        levels = merkle_levels(hashes)
+        root = levels[-1][0]
+        for i, leaf in enumerate(hashes):
+            assert verify_proof(leaf, inclusion_proof(levels, i), root), (n, i)
+
+
+def test_proof_rejects_another_leaf():
+    hashes = leaves(5)
+    levels = merkle_levels(hashes)
+    assert not verify_proof(hashes[1], inclusion_proof(levels, 0), levels[-1][0])
+
+
+def test_proof_rejects_swapped_sides():
+    hashes = leaves(4)
+    levels = merkle_levels(hashes)
+    proof = [dict(step, side='left' if step['side'] == 'right' else 'right')
+             for step in inclusion_proof(levels, 2)]
+    assert not verify_proof(hashes[2], proof, levels[-1][0])
+
+
+def test_leaf_depends_on_the_vote_time():
+    assert (leaf_hash('ab', 1, 2, 3, datetime(2026, 1, 1, 12, 0, 0))
+            != leaf_hash('ab', 1, 2, 3, datetime(2026, 1, 1, 12, 0, 1)))
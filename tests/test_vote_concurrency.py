@@ -0,0 +1,29 @@
+"""A small run of benchmarks/vote_concurrency.py: same checks, fewer voters."""
+import random
+
+import pytest
+
+import vote_concurrency
+from models import db
+
+
+@pytest.fixture(scope='module')
+def database_url(tmp_path_factory):
+    url = f"sqlite:///{tmp_path_factory.mktemp('votes')}/concurrency.db"
+    app = vote_concurrency.build(url)
+    with app.app_context():
+        db.create_all()
+    return url
+
+
+@pytest.mark.parametrize('mode', ['threads', 'processes'])
+def test_every_ballot_is_stored_exactly_once(database_url, mode):
+    app = vote_concurrency.build(database_url)
+    election_id, ballot, tokens = vote_concurrency.setup_election(app, 10, 2, 3, f'test-{mode}')
+    stream = vote_concurrency.ballot_stream(random.Random(0), election_id, ballot, tokens, 3)
+    if mode == 'threads':
+        results = vote_concurrency.run_threads(app, stream, 8)
+    else:
+        results = vote_concurrency.run_processes(database_url, stream, 2)
+    assert len(results) == len(stream)
+    assert vote_concurrency.check(app, election_id, results) == []
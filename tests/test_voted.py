@@ -0,0 +1,32 @@
+from voted import ElectionBitmaps
+
+
+def test_mark_and_has_voted():
+    bitmaps = ElectionBitmaps()
+    bitmaps.mark(1, 5)
+    bitmaps.mark('1', '9')
+    assert bitmaps.has_voted(1, 5)
+    assert bitmaps.has_voted('1', 9)
+    assert not bitmaps.has_voted(1, 4)
+    assert not bitmaps.has_voted(2, 5)
+    assert not bitmaps.has_voted(1, 10_000)
+
+
+def test_bitmaps_grow_for_large_ids():
+    bitmaps = ElectionBitmaps()
+    bitmaps.mark(1, 3)
+    bitmaps.mark(1, 100_000)
+    assert bitmaps.has_voted(1, 3)
+    assert bitmaps.has_voted(1, 100_000)
+    assert not bitmaps.has_voted(1, 99_999)
+    assert bitmaps.memory_bytes() >= 100_000 // 8
+
+
+def test_count_per_position_and_distinct_voters():
+    bitmaps = ElectionBitmaps()
+    for position_id, student_id in [(1, 1), (1, 2), (1, 2), (2, 2), (2, 8)]:
+        bitmaps.mark(position_id, student_id)
+    assert bitmaps.count(1) == 2
+    assert bitmaps.count(2) == 2
+    assert bitmaps.count(3) == 0
+    assert bitmaps.count() == 3
@@ -0,0 +1,131 @@
+"""Per-(election, position) bitmaps of the students who have voted.
+
+Bit ``student_id`` of a position's bitmap is set once that student's ballot
+(plain or ranked) is committed, so ``has_voted`` rejects most duplicates
+before any database work and ``turnout`` counts voters with a popcount. A
+bitmap costs ``max(student_id) / 8`` bytes: about 12 KB per position for
+100k students.
+
+Each worker loads an election's bitmaps from ``votes`` and
+``ranked_ballots`` the first time it needs them and only sets bits for its
+own commits afterwards. ``has_voted`` may therefore miss a vote cast
+through another worker (the ``unique_vote`` constraint still catches it),
+but never reports a vote that did not happen. ``turnout`` first catches up
+on newer rows, so its counts are exact.
+
+Ids are assigned at insert, so a row can become visible after a higher id
+has been read. Catching up therefore only moves its id cursor past rows
+older than ``SETTLE_SECONDS`` and reads the newer ones again next time.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from models import db, RankedBallot, Vote
+
+SETTLE_SECONDS = 10
+
+_elections = {}
+_lock = threading.Lock()
+
+
+class ElectionBitmaps:
+    def __init__(self):
+        self.positions = {}
+        self.last_vote_id = 0
+        self.last_ranked_id = 0
+        self.lock = threading.Lock()
+
+    def mark(self, position_id, student_id):
+        student_id = int(student_id)
+        with self.lock:
+            bitmap = self.positions.setdefault(int(position_id), bytearray())
+            byte = student_id >> 3
+            if byte >= len(bitmap):
+                bitmap.extend(bytes(byte + 1 - len(bitmap) + len(bitmap) // 4))
+            bitmap[byte] |= 1 << (student_id & 7)
+
+    def has_voted(self, position_id, student_id):
+        student_id = int(student_id)
+        bitmap = self.positions.get(int(position_id))
+        byte = student_id >> 3
+        return bitmap is not None and byte < len(bitmap) and bool(bitmap[byte] >> (student_id & 7) & 1)
+
+    def catch_up(self, election_id):
+        """Set bits for ballots committed since the last load, by any worker."""
+        settled = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+        for model, attr in ((Vote, 'last_vote_id'), (RankedBallot, 'last_ranked_id')):
+            rows = db.session.execute(
+                select(model.id, model.position_id, model.student_id, model.vote_time)
+                .where(model.election_id == election_id, model.id > getattr(self, attr))
+                .order_by(model.id)
+            ).all()
+            cursor = getattr(self, attr)
+            for row_id, position_id, student_id, vote_time in rows:
+                self.mark(position_id, student_id)
+                if vote_time is None or vote_time < settled:
+                    cursor = row_id
+            setattr(self, attr, cursor)
+
+    def count(self, position_id=None):
+        if position_id is not None:
+            return _popcount(self.positions.get(int(position_id), b''))
+        with self.lock:
+            combined = 0
+            for bitmap in self.positions.values():
+                combined |= int.from_bytes(bitmap, 'little')
+        return combined.bit_count()
+
+    def memory_bytes(self):
+        return sum(len(b) for b in self.positions.values())
+
+
+def _popcount(bitmap):
+    return int.from_bytes(bitmap, 'little').bit_count()
+
+
+def load(election_id):
+    election_id = int(election_id)
+    bitmaps = _elections.get(election_id)
+    if bitmaps is None:
+        with _lock:
+            bitmaps = _elections.get(election_id)
+            if bitmaps is None:
+                bitmaps = ElectionBitmaps()
+                bitmaps.catch_up(election_id)
+                _elections[election_id] = bitmaps
+    return bitmaps
+
+
+def _ids(*values):
+    try:
+        return [int(v) for v in values]
+    except (TypeError, ValueError):
+        return None
+
+
+def has_voted(election_id, position_id, student_id):
+    ids = _ids(election_id, position_id, student_id)
+    return ids is not None and load(ids[0]).has_voted(ids[1], ids[2])
+
+
+def mark(election_id, position_id, student_id):
+    ids = _ids(election_id, position_id, student_id)
+    if ids is not None:
+        load(ids[0]).mark(ids[1], ids[2])
+
+
+def turnout(election_id):
+    """Distinct voters in the election and per position."""
+    bitmaps = load(election_id)
+    bitmaps.catch_up(int(election_id))
+    return {
+        "voted": bitmaps.count(),
+        "positions": {str(pid): bitmaps.count(pid) for pid in sorted(bitmaps.positions)},
+    }
+
+
+def forget(election_id):
+    with _lock:
+        _elections.pop(int(election_id), None)
@@ -0,0 +1,172 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from zoneinfo import ZoneInfo
+
+from flask import current_app, g, has_request_context
+from sqlalchemy import text
+
+from cache import cache
+import http_cache
+import snapshots
+import voted
+from models import db, Election, Position, Candidate, VotingSession
+
+NAIROBI = ZoneInfo("Africa/Nairobi")
+
+_thread = None
+_lock = threading.Lock()
+
+
+def _as_nairobi(value):
+    # Session times are stored naive and mean Nairobi local time.
+    return value.replace(tzinfo=NAIROBI) if value.tzinfo is None else value
+
+
+def _on_primary(loader):
+    """Run a loader against the primary, even inside a ``read_replica`` view.
+
+    What it loads is cached for every worker, and cast_vote checks ballots
+    against it, so it must not come from a replica that is behind.
+    """
+    @wraps(loader)
+    def wrapper(*args):
+        if not has_request_context():
+            return loader(*args)
+        previous = g.get('use_replica', False)
+        g.use_replica = False
+        try:
+            return loader(*args)
+        finally:
+            g.use_replica = previous
+    return wrapper
+
+
+@_on_primary
+def _load_ballot(election_id):
+    election = db.session.get(Election, election_id)
+    if election is None:
+        return None
+    positions = Position.query.filter_by(election_id=election_id).all()
+    candidates = Candidate.query.filter_by(election_id=election_id).all()
+    return {
+        "election": election.to_dict(),
+        "positions": [p.to_dict() for p in positions],
+        "candidates": [c.to_dict() for c in candidates],
+    }
+
+
+@_on_primary
+def _load_session_window(election_id):
+    session = VotingSession.query.filter_by(election_id=election_id).first()
+    if session is None:
+        return None
+    return {
+        "session_id": session.session_id,
+        "start_time": _as_nairobi(session.start_time),
+        "end_time": _as_nairobi(session.end_time),
+        "status": session.status,
+    }
+
+
+def ballot(election_id):
+    """Election, positions and candidates of an election as plain dicts."""
+    return cache.get_or_load(f'ballot:{election_id}', lambda: _load_ballot(election_id))
+
+
+def session_window(election_id):
+    """Voting window of an election's session, with Nairobi-aware times."""
+    return cache.get_or_load(f'session:{election_id}', lambda: _load_session_window(election_id))
+
+
+def remember_session_window(election_id, window):
+    cache.set(f'session:{election_id}', window)
+
+
+def forget_election(election_id):
+    cache.delete(f'ballot:{election_id}', f'session:{election_id}')
+    http_cache.election_changed(election_id)
+    snapshots.discard(election_id)
+
+
+def results_final(election_id):
+    """True once voting has been closed for ``SNAPSHOT_GRACE_SECONDS``."""
+    window = session_window(election_id)
+    if window is None:
+        return False
+    grace = timedelta(seconds=current_app.config['SNAPSHOT_GRACE_SECONDS'])
+    return datetime.now(NAIROBI) > window['end_time'] + grace
+
+
+def warm_election(election_id):
+    for key, loader in ((f'ballot:{election_id}', _load_ballot),
+                        (f'session:{election_id}', _load_session_window)):
+        value = loader(election_id)
+        if value is not None:
+            cache.set(key, value)
+    voted.load(election_id)
+
+
+def prewarm_pool():
+    """Open (and ping) as many connections as each pool keeps around."""
+    for engine in db.engines.values():
+        size = engine.pool.size() if hasattr(engine.pool, 'size') else 1
+        connections = []
+        try:
+            for _ in range(size):
+                connection = engine.connect()
+                connection.execute(text('SELECT 1'))
+                connections.append(connection)
+        finally:
+            for connection in connections:
+                connection.close()
+
+
+def warm_upcoming(lead):
+    """Warm every election whose session opens within ``lead`` (or is open)."""
+    now = datetime.now(NAIROBI).replace(tzinfo=None)
+    sessions = VotingSession.query.filter(
+        VotingSession.status.in_(['scheduled', 'open']),
+        VotingSession.start_time <= now + lead,
+        VotingSession.end_time >= now,
+    ).all()
+    election_ids = {s.election_id for s in sessions}
+    for election_id in election_ids:
+        warm_election(election_id)
+    if election_ids:
+        prewarm_pool()
+    return election_ids
+
+
+def _run(app):
+    lead = timedelta(seconds=app.config['WARMUP_LEAD_SECONDS'])
+    while True:
+        with app.app_context():
+            try:
+                warm_upcoming(lead)
+            except Exception:
+                app.logger.exception("Cache warm-up failed")
+            finally:
+                db.session.remove()
+        time.sleep(app.config['WARMUP_POLL_SECONDS'])
+
+
+def start(app):
+    """Start this process's warm-up thread (no-op if it is already running)."""
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_run, args=(app,), name='cache-warmup', daemon=True)
+        _thread.start()
+
+
+def init_app(app):
+    if not app.config['WARMUP_ENABLED']:
+        return
+
+    # Threads don't survive a fork, so each worker starts its own on first use.
+    @app.before_request
+    def _start_warmup():
+        start(app)